@@ -1,8 +1,15 @@
 from django.core.exceptions import ObjectDoesNotExist, SuspiciousFileOperation
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.http import HttpResponse, StreamingHttpResponse
+from urllib.parse import quote
 from rest_framework import exceptions
 import os
+import hashlib
+import uuid
 
 from app import models
+from webodm import settings
 
 def get_and_check_project(request, project_pk, perms=('view_project',)):
     """
@@ -40,4 +47,183 @@ def path_traversal_check(unsafe_path, known_safe_path):
         raise SuspiciousFileOperation("{} is not safe".format(unsafe_path))
 
     # Passes the check
-    return unsafe_path
\ No newline at end of file
+    return unsafe_path
+
+def get_file_validators(file_path, *args):
+    """
+    Compute HTTP cache validators for a response generated from a file
+    :param file_path: path to the file
+    :param args: additional values that affect the response (e.g. query parameters)
+    :return: (etag, last_modified) tuple
+    """
+    st = os.stat(file_path)
+    digest = hashlib.sha1("|".join(map(str, [st.st_ino, st.st_mtime_ns, st.st_size] + list(args))).encode('utf-8')).hexdigest()
+    return '"{}"'.format(digest), int(st.st_mtime)
+
+
+def set_cache_headers(response, etag, last_modified, public=False, max_age=0):
+    """
+    Add validators and Cache-Control headers to a response.
+    Responses for resources that are not public can only be stored by the user's browser.
+    Shared caches (proxies, CDNs) can store public resources for at most SHARED_HTTP_MAX_AGE seconds,
+    since they keep serving them if the resource is made private.
+    """
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    if public:
+        response['Cache-Control'] = 'public, max-age={}, s-maxage={}'.format(max_age, min(max_age, settings.SHARED_HTTP_MAX_AGE))
+    else:
+        response['Cache-Control'] = 'private, max-age={}'.format(max_age)
+    return response
+
+
+def get_not_modified_response(request, etag, last_modified, public=False, max_age=0):
+    """
+    Check the request's If-None-Match/If-Modified-Since headers
+    :return: a 304 Not Modified response if the client's copy is still valid, None otherwise
+    """
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        set_cache_headers(response, etag, last_modified, public, max_age)
+    return response
+
+
+def get_offloaded_file_response(file_path):
+    """
+    Delegate sending a file to the web server (via X-Accel-Redirect or X-Sendfile),
+    if FILE_SERVING_MODE is set and the file is located in MEDIA_ROOT.
+    Headers other than the content ones are left to the caller.
+    :return: an empty HttpResponse with the proper header, or None if the file
+        needs to be sent by the application
+    """
+    mode = settings.FILE_SERVING_MODE
+    if not mode:
+        return None
+
+    media_root = os.path.realpath(settings.MEDIA_ROOT)
+    real_path = os.path.realpath(file_path)
+    if os.path.commonpath([media_root, real_path]) != media_root:
+        return None
+
+    response = HttpResponse()
+    if mode == 'x-accel-redirect':
+        rel_path = os.path.relpath(real_path, media_root).replace(os.sep, '/')
+        response['X-Accel-Redirect'] = quote(settings.FILE_SERVING_ACCEL_LOCATION.rstrip('/') + '/' + rel_path)
+    elif mode == 'x-sendfile':
+        response['X-Sendfile'] = real_path
+    else:
+        raise ValueError("Invalid FILE_SERVING_MODE: {}".format(mode))
+
+    return response
+
+
+MAX_BYTE_RANGES = 64
+
+def parse_range_header(header, size):
+    """
+    Parse the value of an HTTP Range header
+    :param header: value of the Range header
+    :param size: size of the resource in bytes
+    :return: list of (start, end) byte ranges (inclusive) that can be satisfied, or
+        None if the header is missing, malformed or asks for too many ranges (in which
+        case it should be ignored and the full content sent). An empty list
+        means that none of the ranges can be satisfied.
+    """
+    if not header:
+        return None
+
+    units, _, ranges_spec = header.partition('=')
+    if units.strip().lower() != 'bytes':
+        return None
+
+    specs = ranges_spec.split(',')
+    if len(specs) > MAX_BYTE_RANGES:
+        return None
+
+    ranges = []
+    for spec in specs:
+        start, sep, end = spec.strip().partition('-')
+        if not sep:
+            return None
+
+        try:
+            if start == '':
+                # Last N bytes
+                length = int(end)
+                if length < 0:
+                    return None
+                if length == 0 or size == 0:
+                    continue
+                ranges.append((max(0, size - length), size - 1))
+            else:
+                start = int(start)
+                end = int(end) if end != '' else size - 1
+                if start < 0 or end < start:
+                    return None
+                if start >= size:
+                    continue
+                ranges.append((start, min(end, size - 1)))
+        except ValueError:
+            return None
+
+    return ranges
+
+
+def read_file_range(file, start, end, chunk_size=64 * 1024):
+    """
+    Generator that yields the bytes from start to end (inclusive) of a file
+    """
+    file.seek(start)
+    remaining = end - start + 1
+    while remaining > 0:
+        chunk = file.read(min(chunk_size, remaining))
+        if not chunk:
+            break
+        remaining -= len(chunk)
+        yield chunk
+
+
+def get_byte_ranges_response(file_path, ranges, content_type):
+    """
+    Build a 206 Partial Content response (or 416 if no range can be satisfied)
+    :param file_path: path to the file
+    :param ranges: byte ranges as returned by parse_range_header
+    :param content_type: content type of the file
+    """
+    filesize = os.stat(file_path).st_size
+
+    if len(ranges) == 0:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = 'bytes */{}'.format(filesize)
+        return response
+
+    if len(ranges) == 1:
+        start, end = ranges[0]
+
+        def content():
+            with open(file_path, 'rb') as f:
+                yield from read_file_range(f, start, end)
+
+        response = StreamingHttpResponse(content(), status=206, content_type=content_type)
+        response['Content-Range'] = 'bytes {}-{}/{}'.format(start, end, filesize)
+        response['Content-Length'] = end - start + 1
+        return response
+
+    boundary = uuid.uuid4().hex
+    headers = [('--{}\r\nContent-Type: {}\r\nContent-Range: bytes {}-{}/{}\r\n\r\n'.format(
+                    boundary, content_type, start, end, filesize)).encode('ascii')
+               for start, end in ranges]
+    footer = '\r\n--{}--\r\n'.format(boundary).encode('ascii')
+
+    def content():
+        with open(file_path, 'rb') as f:
+            for i, (start, end) in enumerate(ranges):
+                yield (b'\r\n' if i > 0 else b'') + headers[i]
+                yield from read_file_range(f, start, end)
+            yield footer
+
+    response = StreamingHttpResponse(content(), status=206,
+                                     content_type='multipart/byteranges; boundary={}'.format(boundary))
+    response['Content-Length'] = sum(len(h) for h in headers) + 2 * (len(ranges) - 1) + \
+                                 sum(end - start + 1 for start, end in ranges) + len(footer)
+    return response
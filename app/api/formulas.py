@@ -5,6 +5,9 @@
 import re
 from functools import lru_cache
 
+import numpy as np
+import numexpr as ne
+
 algos = {
     'NDVI': {
         'expr': '(N - R) / (N + R)',
@@ -109,7 +112,7 @@ camera_filters = [
     # TODO: certain cameras have only two bands? eg. MAPIR NDVI BLUE+NIR
 ]
 
-@lru_cache(maxsize=20)
+@lru_cache(maxsize=256)
 def lookup_formula(algo, band_order = 'RGB'):
     if algo is None:
         return None, None
@@ -133,6 +136,61 @@ def lookup_formula(algo, band_order = 'RGB'):
 
     return expr, hrange
 
+class CompiledFormula:
+    """
+    A band expression (e.g. "(b4-b1)/(b4+b1)", optionally with
+    multiple comma separated expressions) compiled into numexpr programs
+    that take float32 bands as input.
+    """
+    # numexpr signature type of float32 inputs
+    FLOAT32 = float
+
+    def __init__(self, expr, hrange=None):
+        self.expr = expr
+        self.hrange = hrange
+
+        bands = sorted(set(re.findall(r"b(?P<bands>[0-9]{1,2})", expr)), key=int)
+
+        # Raster band indexes (1-based) to read, in the order expected by evaluate
+        self.indexes = tuple(map(int, bands))
+
+        # One program for each expression, with the positions
+        # of the bands (in indexes) that it uses
+        self.programs = []
+        for bloc in expr.split(","):
+            bloc = bloc.strip()
+            bloc_bands = sorted(set(re.findall(r"b(?P<bands>[0-9]{1,2})", bloc)), key=int)
+            program = ne.NumExpr(bloc, signature=[("b" + b, self.FLOAT32) for b in bloc_bands])
+            self.programs.append((program, tuple(bands.index(b) for b in bloc_bands)))
+
+    def evaluate(self, data):
+        """
+        :param data: array of bands, one for each of self.indexes (additional bands are ignored)
+        :return: float32 array with the results of each expression (NaNs replaced by zeros)
+        """
+        data = np.asarray(data, dtype=np.float32)
+        return np.array([np.nan_to_num(program(*[data[i] for i in positions]))
+                         for program, positions in self.programs], dtype=np.float32)
+
+
+@lru_cache(maxsize=256)
+def compile_expression(expr, hrange=None):
+    """
+    :return: a (shared) CompiledFormula for a band expression
+    """
+    return CompiledFormula(expr, hrange)
+
+
+def lookup_compiled_formula(algo, band_order = 'RGB'):
+    """
+    Same as lookup_formula, but returns a CompiledFormula (or None)
+    """
+    expr, hrange = lookup_formula(algo, band_order)
+    if expr is None:
+        return None
+    return compile_expression(expr, hrange)
+
+
 @lru_cache(maxsize=2)
 def get_algorithm_list(max_bands=3):
     return [{'id': k, 'filters': get_camera_filters_for(algos[k], max_bands), **algos[k]} for k in algos if not k.startswith("_")]
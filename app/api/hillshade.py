@@ -5,6 +5,10 @@
 
 
 import numpy as np
+import numexpr as ne
+
+# Largest absolute value of the (exaggerated) partial derivatives
+MAX_DERIVATIVE = 1e18
 
 def _vector_magnitude(arr):
     # things that don't work here:
@@ -77,17 +81,23 @@ class LightSource:
         # consistent to what `imshow` assumes, as well.
         dy = -dy
 
-        # compute the normal vectors from the partial derivatives
-        e_dy, e_dx = np.gradient(vert_exag * elevation, dy, dx)
+        # compute the partial derivatives (single precision is plenty for shading)
+        e_dy, e_dx = np.gradient(np.asarray(elevation, dtype=np.float32), dy, dx)
+
+        # vert_exag * gradient(elevation) == gradient(vert_exag * elevation)
+        # Huge exaggerations would overflow when squaring the derivatives below,
+        # limiting them has no visible effect (the normals are ~horizontal anyway)
+        for e in (e_dx, e_dy):
+            np.multiply(e, vert_exag, out=e)
+            np.clip(e, -MAX_DERIVATIVE, MAX_DERIVATIVE, out=e)
+
+        # The dot product of the light direction with the unit normal
+        # (-e_dx, -e_dy, 1) / |(-e_dx, -e_dy, 1)|, computed in a single pass
+        d0, d1, d2 = self.direction.astype(np.float32)
 
-        # .view is to keep subclasses
-        normal = np.empty(elevation.shape + (3,)).view(type(elevation))
-        normal[..., 0] = -e_dx
-        normal[..., 1] = -e_dy
-        normal[..., 2] = 1
-        normal /= _vector_magnitude(normal)
+        intensity = ne.evaluate("(d2 - d0 * e_dx - d1 * e_dy) / sqrt(1 + e_dx * e_dx + e_dy * e_dy)")
 
-        return self.shade_normals(normal, fraction)
+        return self._stretch(intensity, fraction)
 
     def shade_normals(self, normals, fraction=1.):
         """
@@ -113,7 +123,12 @@ class LightSource:
         """
 
         intensity = normals.dot(self.direction)
+        return self._stretch(intensity, fraction)
 
+    def _stretch(self, intensity, fraction=1.):
+        """
+        Apply contrast stretch and rescale intensity to 0-1 (in place)
+        """
         # Apply contrast stretch
         imin, imax = intensity.min(), intensity.max()
         intensity *= fraction
@@ -128,6 +143,6 @@ class LightSource:
             # visually appears better than a "hard" clip.
             intensity -= imin
             intensity /= (imax - imin)
-        intensity = np.clip(intensity, 0, 1)
+        np.clip(intensity, 0, 1, out=intensity)
 
         return intensity
\ No newline at end of file
@@ -93,10 +93,52 @@ def hsv_to_rgb( hsv ):
 
 
 def hsv_blend(rgb, intensity):
-    hsv = rgb_to_hsv(rgb[0], rgb[1], rgb[2])
-
-    #replace v with hillshade
-    hsv_adjusted = np.asarray( [hsv[0], hsv[1], intensity] )
-
-    #convert back to RGB
-    return hsv_to_rgb( hsv_adjusted )
\ No newline at end of file
+    """
+    Replace the value (brightness) of an RGB image with an intensity image,
+    keeping its hue and saturation. This is equivalent to
+    hsv_to_rgb([h, s, intensity]) where h, s come from rgb_to_hsv(rgb),
+    but is computed in single precision and skips the unused value channel.
+    :param rgb: uint8 array of shape (3, height, width)
+    :param intensity: array of shape (height, width) with values in the range [0,255]
+    :return: uint8 array of shape (3, height, width)
+    """
+    r = rgb[0].astype(np.float32)
+    g = rgb[1].astype(np.float32)
+    b = rgb[2].astype(np.float32)
+
+    maxc = np.maximum(np.maximum(r, g), b)
+    delta = maxc - np.minimum(np.minimum(r, g), b)
+
+    s = delta / np.maximum(maxc, 1)
+
+    # Reset zeros to ones to avoid divide by zeros (hue is zero for grays)
+    delta[delta == 0] = 1
+
+    # Hue in the range [0,6)
+    h = np.where(maxc == r, (g - b) / delta,
+                 np.where(maxc == g, 2 + (b - r) / delta,
+                                     4 + (r - g) / delta))
+    np.mod(h, 6, out=h)
+
+    i = h.astype(np.uint8)
+    np.minimum(i, 5, out=i)
+    f = h
+    f -= i
+
+    v = np.asarray(intensity, dtype=np.float32)
+    p = v * (1 - s)
+
+    # q = v * (1 - s * f), t = v * (1 - s * (1 - f))
+    q = s * f
+    t = s - q
+    np.subtract(1, q, out=q)
+    q *= v
+    np.subtract(1, t, out=t)
+    t *= v
+
+    out = np.empty((3,) + v.shape, dtype=np.uint8)
+    out[0] = np.choose(i, (v, q, p, p, t, v))
+    out[1] = np.choose(i, (t, v, v, q, p, p))
+    out[2] = np.choose(i, (p, p, t, v, v, q))
+
+    return out
@@ -83,4 +83,4 @@ class ImageDownload(TaskNestedView):
         if not os.path.isfile(image_path):
             raise exceptions.NotFound()
 
-        return download_file_response(request, image_path, 'attachment')
\ No newline at end of file
+        return download_file_response(request, image_path, 'attachment', task.public)
\ No newline at end of file
@@ -9,17 +9,21 @@ from django.core.files.uploadedfile import InMemoryUploadedFile
 from django.db import transaction
 from django.http import FileResponse
 from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
+from django.utils.http import http_date
 from rest_framework import status, serializers, viewsets, filters, exceptions, permissions, parsers
 from rest_framework.decorators import detail_route
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from app import models, pending_actions
+from app import models, pending_actions, task_access_cache
 from nodeodm import status_codes
 from nodeodm.models import ProcessingNode
 from worker import tasks as worker_tasks
-from .common import get_and_check_project
+from .common import get_and_check_project, get_file_validators, get_not_modified_response, set_cache_headers, \
+    get_offloaded_file_response, parse_range_header, get_byte_ranges_response
+from webodm import settings
 from app.security import path_traversal_check
 
 
@@ -67,7 +71,7 @@ class TaskSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = models.Task
-        exclude = ('console_output', 'orthophoto_extent', 'dsm_extent', 'dtm_extent', )
+        exclude = ('orthophoto_extent', 'dsm_extent', 'dtm_extent', )
         read_only_fields = ('processing_time', 'status', 'last_error', 'created_at', 'pending_action', 'available_assets', )
 
 class TaskViewSet(viewsets.ViewSet):
@@ -76,7 +80,7 @@ class TaskViewSet(viewsets.ViewSet):
     A task represents a set of images and other input to be sent to a processing node.
     Once a processing node completes processing, results are stored in the task.
     """
-    queryset = models.Task.objects.all().defer('orthophoto_extent', 'dsm_extent', 'dtm_extent', 'console_output', )
+    queryset = models.Task.objects.all().defer('orthophoto_extent', 'dsm_extent', 'dtm_extent', )
     
     parser_classes = (parsers.MultiPartParser, parsers.JSONParser, parsers.FormParser, )
     ordering_fields = '__all__'
@@ -138,8 +142,7 @@ class TaskViewSet(viewsets.ViewSet):
             raise exceptions.NotFound()
 
         line_num = max(0, int(request.query_params.get('line', 0)))
-        output = task.console_output or ""
-        return Response('\n'.join(output.rstrip().split('\n')[line_num:]))
+        return Response(task.console.output(line_num).rstrip())
 
     def list(self, request, project_pk=None):
         get_and_check_project(request, project_pk)
@@ -269,10 +272,25 @@ class TaskViewSet(viewsets.ViewSet):
 
 
 class TaskNestedView(APIView):
-    queryset = models.Task.objects.all().defer('orthophoto_extent', 'dtm_extent', 'dsm_extent', 'console_output', )
+    queryset = models.Task.objects.all().defer('orthophoto_extent', 'dtm_extent', 'dsm_extent', )
     permission_classes = (AllowAny, )
 
+    # Views that only read the task (e.g. the tiler) can look up
+    # tasks and permissions from a short lived, in-process cache
+    cache_task_access = False
+
     def get_and_check_task(self, request, pk, annotate={}):
+        if self.cache_task_access and not annotate:
+            try:
+                task = task_access_cache.get_task(pk)
+            except (ObjectDoesNotExist, ValidationError):
+                raise exceptions.NotFound()
+
+            if not task.public and not task_access_cache.has_project_access(request.user, task.project):
+                raise exceptions.NotFound()
+
+            return task
+
         try:
             task = self.queryset.annotate(**annotate).get(pk=pk)
         except (ObjectDoesNotExist, ValidationError):
@@ -285,23 +303,48 @@ class TaskNestedView(APIView):
         return task
 
 
-def download_file_response(request, filePath, content_disposition):
+def download_file_response(request, filePath, content_disposition, public=False):
     filename = os.path.basename(filePath)
     filesize = os.stat(filePath).st_size
-    file = open(filePath, "rb")
 
-    # More than 100mb, normal http response, otherwise stream
-    # Django docs say to avoid streaming when possible
-    stream = filesize > 1e8 or request.GET.get('_force_stream', False)
-    if stream:
-        response = FileResponse(file)
+    etag, last_modified = get_file_validators(filePath)
+    not_modified = get_not_modified_response(request, etag, last_modified, public, settings.ASSET_HTTP_MAX_AGE)
+    if not_modified is not None:
+        return not_modified
+
+    content_type = mimetypes.guess_type(filename)[0] or "application/zip"
+    response = get_offloaded_file_response(filePath)
+    stream = False
+
+    if response is None:
+        # Partial content is only sent if the client's copy
+        # of the file (if any) is still valid
+        ranges = None
+        if_range = request.META.get('HTTP_IF_RANGE')
+        if if_range is None or if_range in (etag, http_date(last_modified)):
+            ranges = parse_range_header(request.META.get('HTTP_RANGE'), filesize)
+
+        if ranges is not None:
+            response = get_byte_ranges_response(filePath, ranges, content_type)
+        else:
+            file = open(filePath, "rb")
+
+            # More than 100mb, normal http response, otherwise stream
+            # Django docs say to avoid streaming when possible
+            stream = filesize > 1e8 or request.GET.get('_force_stream', False)
+            if stream:
+                response = FileResponse(file)
+            else:
+                response = HttpResponse(FileWrapper(file), content_type=content_type)
+            response['Content-Type'] = content_type
+            response['Content-Length'] = filesize
+
+        response['Accept-Ranges'] = 'bytes'
     else:
-        response = HttpResponse(FileWrapper(file),
-                                content_type=(mimetypes.guess_type(filename)[0] or "application/zip"))
+        response['Content-Type'] = content_type
 
-    response['Content-Type'] = mimetypes.guess_type(filename)[0] or "application/zip"
     response['Content-Disposition'] = "{}; filename={}".format(content_disposition, filename)
-    response['Content-Length'] = filesize
+    set_cache_headers(response, etag, last_modified, public, settings.ASSET_HTTP_MAX_AGE)
 
     # For testing
     if stream:
@@ -330,7 +373,7 @@ class TaskDownloads(TaskNestedView):
         if not os.path.exists(asset_path):
             raise exceptions.NotFound("Asset does not exist")
 
-        return download_file_response(request, asset_path, 'attachment')
+        return download_file_response(request, asset_path, 'attachment', task.public)
 
 """
 Raw access to the task's asset folder resources
@@ -352,7 +395,32 @@ class TaskAssets(TaskNestedView):
         if (not os.path.exists(asset_path)) or os.path.isdir(asset_path):
             raise exceptions.NotFound("Asset does not exist")
 
-        return download_file_response(request, asset_path, 'inline')
+        return download_file_response(request, asset_path, 'inline', task.public)
+
+"""
+Notifications from processing nodes
+"""
+class TaskWebhook(APIView):
+    permission_classes = (permissions.AllowAny,)
+
+    def post(self, request, project_pk=None, pk=None):
+        """
+        Called by processing nodes when the status of a task changes,
+        so that the task is processed without waiting for its next poll
+        """
+        try:
+            task = models.Task.objects.get(pk=pk, project=project_pk)
+        except (ObjectDoesNotExist, ValidationError):
+            raise exceptions.NotFound()
+
+        if not constant_time_compare(request.query_params.get('token', ''), task.get_webhook_token()):
+            raise exceptions.PermissionDenied()
+
+        worker_tasks.schedule_task(task.id)
+        worker_tasks.process_task.delay(task.id)
+
+        return Response({'success': True}, status=status.HTTP_200_OK)
+
 
 """
 Task assets import
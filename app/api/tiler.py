@@ -1,28 +1,50 @@
-import rasterio
+import re
+import uuid
+import mercantile
+from functools import lru_cache
 from rasterio.enums import ColorInterp
+from rasterio.warp import transform_bounds
 import urllib
 import os
 from django.http import HttpResponse
 from rio_tiler.errors import TileOutsideBounds
 from rio_tiler.mercator import get_zooms
-from rio_tiler import main
-from rio_tiler.utils import array_to_image, get_colormap, expression, linear_rescale, _chunks, _apply_discrete_colormap, has_alpha_band, \
-    non_alpha_indexes
+from rio_tiler.utils import array_to_image, get_colormap, _chunks, _apply_discrete_colormap, has_alpha_band, \
+    non_alpha_indexes, tile_exists, tile_read
 from rio_tiler.profiles import img_profiles
 
 import numpy as np
 
 from app.raster_utils import export_raster_index
+from app import tile_cache
+from app.dataset_pool import open_dataset
+from app.raster_stats import get_raster_stats
 from .hsvblend import hsv_blend
 from .hillshade import LightSource
-from .formulas import lookup_formula, get_algorithm_list
+from .formulas import lookup_formula, lookup_compiled_formula, get_algorithm_list
 from .tasks import TaskNestedView
+from .common import get_file_validators, get_not_modified_response, set_cache_headers
 from rest_framework import exceptions
 from rest_framework.response import Response
+from webodm import settings
 from worker.tasks import export_raster_index
 
 ZOOM_EXTRA_LEVELS = 2
 
+# Maximum number of tiles that can be requested at once (see TilesBatch)
+MAX_BATCH_TILES = 256
+
+# Number of pixels read around elevation tiles
+# to compute seamless hillshading
+HILLSHADE_BUFFER = 16
+
+# Supported tile extensions --> GDAL image driver
+TILE_FORMATS = {
+    'png': 'png',
+    'jpg': 'jpeg',
+    'webp': 'webp',
+}
+
 def get_zoom_safe(src_dst):
     minzoom, maxzoom = get_zooms(src_dst)
     if maxzoom < minzoom:
@@ -30,8 +52,34 @@ def get_zoom_safe(src_dst):
 
     return minzoom, maxzoom
 
+def get_tile_format(tile_type, query_params):
+    """
+    Image format (extension) of the tiles to serve for a tile type,
+    either requested via the "tile_format" query parameter or the server default
+    """
+    ext = query_params.get('tile_format')
+    if not ext:
+        ext = settings.TILE_FORMATS.get(tile_type, 'png')
+
+    if ext not in TILE_FORMATS:
+        raise exceptions.ValidationError("Invalid tile_format value: {}".format(ext))
+
+    return ext
+
+def get_default_rescale(statistics):
+    """
+    :param statistics: raster statistics (as returned by the metadata endpoint)
+    :return: the rescale value used by the map viewer when it first displays a layer
+    """
+    band_stats = statistics.get('1', statistics.get(1))
+    if band_stats is None:
+        return "-1,1"
+
+    return "{},{}".format(band_stats['min'], band_stats['max'])
+
 def get_tile_url(task, tile_type, query_params):
-    url = '/api/projects/{}/tasks/{}/{}/tiles/{{z}}/{{x}}/{{y}}.png'.format(task.project.id, task.id, tile_type)
+    url = '/api/projects/{}/tasks/{}/{}/tiles/{{z}}/{{x}}/{{y}}.{}'.format(task.project.id, task.id, tile_type,
+                                                                         get_tile_format(tile_type, query_params))
     params = {}
 
     for k in ['formula', 'bands', 'rescale', 'color_map', 'hillshade']:
@@ -43,6 +91,17 @@ def get_tile_url(task, tile_type, query_params):
 
     return url
 
+def get_image_content_type(img):
+    """
+    Content type of an encoded tile, by inspecting its signature
+    """
+    if img[:3] == b'\xff\xd8\xff':
+        return 'image/jpeg'
+    elif img[:4] == b'RIFF' and img[8:12] == b'WEBP':
+        return 'image/webp'
+    else:
+        return 'image/png'
+
 def get_extent(task, tile_type):
     extent_map = {
         'orthophoto': task.orthophoto_extent,
@@ -64,31 +123,87 @@ def get_raster_path(task, tile_type):
     return task.get_asset_download_path(tile_type + ".tif")
 
 
+def read_tile(src, x, y, z, tilesize=256, buffer=0, **kwargs):
+    """
+    Read a mercator tile from an open dataset
+    (same as rio_tiler.main.tile, but does not open the raster)
+    :param buffer: number of extra pixels to read around each side of the tile.
+        The returned arrays have a size of tilesize + buffer * 2
+    """
+    wgs_bounds = transform_bounds(src.crs, "epsg:4326", *src.bounds, densify_pts=21)
+    if not tile_exists(wgs_bounds, z, x, y):
+        raise TileOutsideBounds("Tile {}/{}/{} is outside image bounds".format(z, x, y))
+
+    tile_bounds = mercantile.xy_bounds(mercantile.Tile(x=x, y=y, z=z))
+    if buffer > 0:
+        pad = buffer * (tile_bounds.right - tile_bounds.left) / tilesize
+        tile_bounds = (tile_bounds.left - pad, tile_bounds.bottom - pad,
+                       tile_bounds.right + pad, tile_bounds.top + pad)
+
+    return tile_read(src, tile_bounds, tilesize + buffer * 2, **kwargs)
+
+
+def read_expression_tile(src, x, y, z, formula, tilesize=256, **kwargs):
+    """
+    Read a mercator tile from an open dataset and apply a band expression
+    (same as rio_tiler.utils.expression, but does not open the raster)
+    :param formula: CompiledFormula
+    """
+    arr, mask = read_tile(src, x, y, z, tilesize, indexes=formula.indexes, **kwargs)
+    return formula.evaluate(arr), mask
+
+
+@lru_cache(maxsize=64)
+def parse_rescale(rescale, band_count):
+    """
+    Parse a rescale string (e.g. "0,1000" or "0,255,0,255,0,255")
+    :return: tuple of (min, max) pairs, one for each band
+    """
+    values = list(map(float, rescale.split(",")))
+    if len(values) == 0 or len(values) % 2 != 0:
+        raise ValueError("Invalid rescale value")
+
+    ranges = tuple(_chunks(values, 2))
+    if len(ranges) != band_count:
+        ranges = (ranges[0],) * band_count
+
+    return tuple(tuple(r) for r in ranges)
+
+
+@lru_cache(maxsize=32)
+def get_colormap_lut(name):
+    """
+    Get a colormap as a lookup table of shape (channels, 256)
+    that can be applied to uint8 tiles with np.take
+    """
+    lut = np.asarray(get_colormap(name, format="gdal"), dtype=np.uint8)
+    lut = np.ascontiguousarray(lut.T)
+    lut.flags.writeable = False
+    return lut
+
+
 def rescale_tile(tile, mask, rescale = None):
     if rescale:
         try:
-            rescale_arr = list(map(float, rescale.split(",")))
+            rescale_arr = parse_rescale(rescale, tile.shape[0])
         except ValueError:
             raise exceptions.ValidationError("Invalid rescale value")
 
-        rescale_arr = list(_chunks(rescale_arr, 2))
-        if len(rescale_arr) != tile.shape[0]:
-            rescale_arr = ((rescale_arr[0]),) * tile.shape[0]
-
-        for bdx in range(tile.shape[0]):
-            if mask is not None:
-                tile[bdx] = np.where(
-                    mask,
-                    linear_rescale(
-                        tile[bdx], in_range=rescale_arr[bdx], out_range=[0, 255]
-                    ),
-                    0,
-                )
-            else:
-                tile[bdx] = linear_rescale(
-                    tile[bdx], in_range=rescale_arr[bdx], out_range=[0, 255]
-                )
-        tile = tile.astype(np.uint8)
+        # Rescale, clip and quantize each band directly into the output
+        out = np.empty(tile.shape, dtype=np.uint8)
+        buf = np.empty(tile.shape[1:], dtype=np.float32)
+
+        for bdx, (imin, imax) in enumerate(rescale_arr):
+            np.clip(tile[bdx], imin, imax, out=buf)
+            buf -= imin
+            if imax != imin:
+                buf *= 255.0 / (imax - imin)
+            out[bdx] = buf
+
+        if mask is not None:
+            out[:, mask == 0] = 0
+
+        tile = out
 
     return tile, mask
 
@@ -97,11 +212,26 @@ def apply_colormap(tile, color_map = None):
     if color_map is not None and isinstance(color_map, dict):
         tile = _apply_discrete_colormap(tile, color_map)
     elif color_map is not None:
-        tile = np.transpose(color_map[tile][0], [2, 0, 1]).astype(np.uint8)
+        tile = np.take(color_map, tile[0], axis=1)
 
     return tile
 
+def get_cache_validators(task, raster_path, query_params):
+    """
+    HTTP cache validators for responses that depend on a task's raster,
+    its name/project and the request's query parameters
+    """
+    return get_file_validators(raster_path, task.project.id, task.name, query_params.urlencode())
+
+def not_modified_response(request, task, etag, last_modified):
+    return get_not_modified_response(request, etag, last_modified, task.public, settings.TILE_HTTP_MAX_AGE)
+
+def with_cache_headers(response, task, etag, last_modified):
+    return set_cache_headers(response, etag, last_modified, task.public, settings.TILE_HTTP_MAX_AGE)
+
 class TileJson(TaskNestedView):
+    cache_task_access = True
+
     def get(self, request, pk=None, project_pk=None, tile_type=""):
         """
         Get tile.json for this tasks's asset type
@@ -112,10 +242,15 @@ class TileJson(TaskNestedView):
         if not os.path.isfile(raster_path):
             raise exceptions.NotFound()
 
-        with rasterio.open(raster_path) as src_dst:
+        etag, last_modified = get_cache_validators(task, raster_path, self.request.query_params)
+        response = not_modified_response(request, task, etag, last_modified)
+        if response is not None:
+            return response
+
+        with open_dataset(raster_path) as src_dst:
             minzoom, maxzoom = get_zoom_safe(src_dst)
 
-        return Response({
+        return with_cache_headers(Response({
             'tilejson': '2.1.0',
             'name': task.name,
             'version': '1.0.0',
@@ -124,21 +259,42 @@ class TileJson(TaskNestedView):
             'minzoom': minzoom - ZOOM_EXTRA_LEVELS,
             'maxzoom': maxzoom + ZOOM_EXTRA_LEVELS,
             'bounds': get_extent(task, tile_type).extent
-        })
+        }), task, etag, last_modified)
 
 class Bounds(TaskNestedView):
+    cache_task_access = True
+
     def get(self, request, pk=None, project_pk=None, tile_type=""):
         """
         Get the bounds for this tasks's asset type
         """
         task = self.get_and_check_task(request, pk)
 
-        return Response({
+        extent = get_extent(task, tile_type)
+        raster_path = get_raster_path(task, tile_type)
+
+        # Bounds are stored in the database, the raster is only needed for cache validation
+        if os.path.isfile(raster_path):
+            etag, last_modified = get_cache_validators(task, raster_path, self.request.query_params)
+            response = not_modified_response(request, task, etag, last_modified)
+            if response is not None:
+                return response
+        else:
+            etag = None
+
+        response = Response({
             'url': get_tile_url(task, tile_type, self.request.query_params),
-            'bounds': get_extent(task, tile_type).extent
+            'bounds': extent.extent
         })
 
+        if etag is not None:
+            response = with_cache_headers(response, task, etag, last_modified)
+
+        return response
+
 class Metadata(TaskNestedView):
+    cache_task_access = True
+
     def get(self, request, pk=None, project_pk=None, tile_type=""):
         """
         Get the metadata for this tasks's asset type
@@ -156,24 +312,20 @@ class Metadata(TaskNestedView):
         except ValueError as e:
             raise exceptions.ValidationError(str(e))
 
-        pmin, pmax = 2.0, 98.0
         raster_path = get_raster_path(task, tile_type)
 
         if not os.path.isfile(raster_path):
             raise exceptions.NotFound()
 
-        try:
-            with rasterio.open(raster_path, "r") as src:
-                band_count = src.meta['count']
-                if has_alpha_band(src):
-                    band_count -= 1
+        etag, last_modified = get_cache_validators(task, raster_path, self.request.query_params)
+        response = not_modified_response(request, task, etag, last_modified)
+        if response is not None:
+            return response
 
-                nodata = None
-                # Workaround for https://github.com/OpenDroneMap/WebODM/issues/894
-                if band_count > 4:
-                    nodata = 0
-
-                info = main.metadata(src, pmin=pmin, pmax=pmax, histogram_bins=255, histogram_range=hrange, expr=expr, nodata=nodata)
+        try:
+            stats = get_raster_stats(task, tile_type, raster_path, expr, hrange)
+            band_count = stats['band_count']
+            info = stats['info']
         except IndexError as e:
             # Caught when trying to get an invalid raster metadata
             raise exceptions.ValidationError("Cannot retrieve raster metadata: %s" % str(e))
@@ -217,138 +369,106 @@ class Metadata(TaskNestedView):
                 except FileNotFoundError:
                     raise exceptions.ValidationError("Not a valid color_map value: %s" % cmap)
 
-        del info['address']
         info['name'] = task.name
         info['scheme'] = 'xyz'
         info['tiles'] = [get_tile_url(task, tile_type, self.request.query_params)]
+        info['rescale'] = get_default_rescale(info['statistics'])
 
         if info['maxzoom'] < info['minzoom']:
             info['maxzoom'] = info['minzoom']
         info['maxzoom'] += ZOOM_EXTRA_LEVELS
         info['minzoom'] -= ZOOM_EXTRA_LEVELS
 
-        return Response(info)
-
-def get_elevation_tiles(elevation, url, x, y, z, tilesize, nodata, resampling, padding):
-    tile = np.full((tilesize * 3, tilesize * 3), nodata, dtype=elevation.dtype)
-
-    try:
-        left, _ = main.tile(url, x - 1, y, z, indexes=1, tilesize=tilesize, nodata=nodata,
-                            resampling_method=resampling, tile_edge_padding=padding)
-        tile[tilesize:tilesize*2,0:tilesize] = left
-    except TileOutsideBounds:
-        pass
-
-    try:
-        right, _ = main.tile(url, x + 1, y, z, indexes=1, tilesize=tilesize, nodata=nodata,
-                             resampling_method=resampling, tile_edge_padding=padding)
-        tile[tilesize:tilesize*2,tilesize*2:tilesize*3] = right
-    except TileOutsideBounds:
-        pass
-
-    try:
-        bottom, _ = main.tile(url, x, y + 1, z, indexes=1, tilesize=tilesize, nodata=nodata,
-                              resampling_method=resampling, tile_edge_padding=padding)
-        tile[tilesize*2:tilesize*3,tilesize:tilesize*2] = bottom
-    except TileOutsideBounds:
-        pass
+        return with_cache_headers(Response(info), task, etag, last_modified)
+
+def get_tile_params(tile_type, query_params):
+    """
+    Read the tile rendering parameters from a request's query parameters
+    and fill in the defaults for the tile type
+    :return: dict with formula, bands, rescale, color_map and hillshade keys
+    """
+    formula = query_params.get('formula')
+    bands = query_params.get('bands')
+    rescale = query_params.get('rescale')
+    color_map = query_params.get('color_map')
+    hillshade = query_params.get('hillshade')
+
+    if formula == '': formula = None
+    if bands == '': bands = None
+    if rescale == '': rescale = None
+    if color_map == '': color_map = None
+    if hillshade == '' or hillshade == '0': hillshade = None
 
     try:
-        top, _ = main.tile(url, x, y - 1, z, indexes=1, tilesize=tilesize, nodata=nodata,
-                           resampling_method=resampling, tile_edge_padding=padding)
-        tile[0:tilesize,tilesize:tilesize*2] = top
-    except TileOutsideBounds:
-        pass
-
-    tile[tilesize:tilesize*2,tilesize:tilesize*2] = elevation
-
-    return tile
-
-
-class Tiles(TaskNestedView):
-    def get(self, request, pk=None, project_pk=None, tile_type="", z="", x="", y="", scale=1):
-        """
-        Get a tile image
-        """
-        task = self.get_and_check_task(request, pk)
-
-        z = int(z)
-        x = int(x)
-        y = int(y)
-
-        scale = int(scale)
-        ext = "png"
-        driver = "jpeg" if ext == "jpg" else ext
-
-        indexes = None
-        nodata = None
-
-        formula = self.request.query_params.get('formula')
-        bands = self.request.query_params.get('bands')
-        rescale = self.request.query_params.get('rescale')
-        color_map = self.request.query_params.get('color_map')
-        hillshade = self.request.query_params.get('hillshade')
-
-        if formula == '': formula = None
-        if bands == '': bands = None
-        if rescale == '': rescale = None
-        if color_map == '': color_map = None
-        if hillshade == '' or hillshade == '0': hillshade = None
+        lookup_compiled_formula(formula, bands)
+    except ValueError as e:
+        raise exceptions.ValidationError(str(e))
 
-        try:
-            expr, _ = lookup_formula(formula, bands)
-        except ValueError as e:
-            raise exceptions.ValidationError(str(e))
+    if tile_type in ['dsm', 'dtm'] and rescale is None:
+        rescale = "0,1000"
 
-        if tile_type in ['dsm', 'dtm'] and rescale is None:
-            rescale = "0,1000"
+    if tile_type in ['dsm', 'dtm'] and color_map is None:
+        color_map = "gray"
 
-        if tile_type in ['dsm', 'dtm'] and color_map is None:
+    if tile_type == 'orthophoto' and formula is not None:
+        if color_map is None:
             color_map = "gray"
+        if rescale is None:
+            rescale = "-1,1"
+
+    return {
+        'formula': formula,
+        'bands': bands,
+        'rescale': rescale,
+        'color_map': color_map,
+        'hillshade': hillshade
+    }
 
-        if tile_type == 'orthophoto' and formula is not None:
-            if color_map is None:
-                color_map = "gray"
-            if rescale is None:
-                rescale = "-1,1"
-
-        if nodata is not None:
-            nodata = np.nan if nodata == "nan" else float(nodata)
-        tilesize = scale * 256
-
-        url = get_raster_path(task, tile_type)
-
-        if not os.path.isfile(url):
+def render_tile(raster_path, tile_type, z, x, y, scale, ext, params):
+    """
+    Render a tile image
+    :param raster_path: path to the task's raster
+    :param params: tile rendering parameters (see get_tile_params)
+    :return: encoded image (bytes)
+    """
+    indexes = None
+    nodata = None
+
+    rescale = params['rescale']
+    color_map = params['color_map']
+    hillshade = params['hillshade']
+    compiled_formula = lookup_compiled_formula(params['formula'], params['bands'])
+
+    tilesize = scale * 256
+
+    with open_dataset(raster_path) as src:
+        minzoom, maxzoom = get_zoom_safe(src)
+        has_alpha = has_alpha_band(src)
+        if z < minzoom - ZOOM_EXTRA_LEVELS or z > maxzoom + ZOOM_EXTRA_LEVELS:
             raise exceptions.NotFound()
 
-        with rasterio.open(url) as src:
-            minzoom, maxzoom = get_zoom_safe(src)
-            has_alpha = has_alpha_band(src)
-            if z < minzoom - ZOOM_EXTRA_LEVELS or z > maxzoom + ZOOM_EXTRA_LEVELS:
-                raise exceptions.NotFound()
-
-            # Handle N-bands datasets for orthophotos (not plant health)
-            if tile_type == 'orthophoto' and expr is None:
-                ci = src.colorinterp
-
-                # More than 4 bands?
-                if len(ci) > 4:
-                    # Try to find RGBA band order
-                    if ColorInterp.red in ci and \
-                        ColorInterp.green in ci and \
-                        ColorInterp.blue in ci:
-                        indexes = (ci.index(ColorInterp.red) + 1,
-                                   ci.index(ColorInterp.green) + 1,
-                                   ci.index(ColorInterp.blue) + 1,)
-                    else:
-                        # Fallback to first three
-                        indexes = (1, 2, 3, )
-                elif has_alpha:
-                    indexes = non_alpha_indexes(src)
-            
-            # Workaround for https://github.com/OpenDroneMap/WebODM/issues/894
-            if nodata is None and src.meta['count'] > 4:
-                nodata = 0
+        # Handle N-bands datasets for orthophotos (not plant health)
+        if tile_type == 'orthophoto' and compiled_formula is None:
+            ci = src.colorinterp
+
+            # More than 4 bands?
+            if len(ci) > 4:
+                # Try to find RGBA band order
+                if ColorInterp.red in ci and \
+                    ColorInterp.green in ci and \
+                    ColorInterp.blue in ci:
+                    indexes = (ci.index(ColorInterp.red) + 1,
+                               ci.index(ColorInterp.green) + 1,
+                               ci.index(ColorInterp.blue) + 1,)
+                else:
+                    # Fallback to first three
+                    indexes = (1, 2, 3, )
+            elif has_alpha:
+                indexes = non_alpha_indexes(src)
+
+        # Workaround for https://github.com/OpenDroneMap/WebODM/issues/894
+        if nodata is None and src.meta['count'] > 4:
+            nodata = 0
 
         resampling="nearest"
         padding=0
@@ -356,34 +476,40 @@ class Tiles(TaskNestedView):
             resampling="bilinear"
             padding=16
 
+        buffer = 0
+        if hillshade is not None:
+            try:
+                hillshade = float(hillshade)
+                if hillshade <= 0:
+                    hillshade = 1.0
+            except ValueError:
+                raise exceptions.ValidationError("Invalid hillshade value")
+
+            # Hillshading is not a local tile operation and
+            # requires neighbor pixels to be rendered seamlessly
+            buffer = HILLSHADE_BUFFER
+
         try:
-            if expr is not None:
-                tile, mask = expression(
-                    url, x, y, z, expr=expr, tilesize=tilesize, nodata=nodata, tile_edge_padding=padding, resampling_method=resampling
+            if compiled_formula is not None:
+                tile, mask = read_expression_tile(
+                    src, x, y, z, formula=compiled_formula, tilesize=tilesize, buffer=buffer, nodata=nodata, tile_edge_padding=padding, resampling_method=resampling
                 )
             else:
-                tile, mask = main.tile(
-                    url, x, y, z, indexes=indexes, tilesize=tilesize, nodata=nodata, tile_edge_padding=padding, resampling_method=resampling
+                tile, mask = read_tile(
+                    src, x, y, z, indexes=indexes, tilesize=tilesize, buffer=buffer, nodata=nodata, tile_edge_padding=padding, resampling_method=resampling
                 )
         except TileOutsideBounds:
             raise exceptions.NotFound("Outside of bounds")
 
         if color_map:
             try:
-                color_map = get_colormap(color_map, format="gdal")
+                color_map = get_colormap_lut(color_map)
             except FileNotFoundError:
                 raise exceptions.ValidationError("Not a valid color_map value")
 
         intensity = None
 
         if hillshade is not None:
-            try:
-                hillshade = float(hillshade)
-                if hillshade <= 0:
-                    hillshade = 1.0
-            except ValueError:
-                raise exceptions.ValidationError("Invalid hillshade value")
-
             if tile.shape[0] != 1:
                 raise exceptions.ValidationError("Cannot compute hillshade of non-elevation raster (multiple bands found)")
 
@@ -392,30 +518,145 @@ class Tiles(TaskNestedView):
             dy = -src.meta["transform"][4] * delta_scale
 
             ls = LightSource(azdeg=315, altdeg=45)
+            intensity = ls.hillshade(tile[0], dx=dx, dy=dy, vert_exag=hillshade)
 
-            # Hillshading is not a local tile operation and
-            # requires neighbor tiles to be rendered seamlessly
-            elevation = get_elevation_tiles(tile[0], url, x, y, z, tilesize, nodata, resampling, padding)
-            intensity = ls.hillshade(elevation, dx=dx, dy=dy, vert_exag=hillshade)
-            intensity = intensity[tilesize:tilesize*2,tilesize:tilesize*2]
+            # Remove buffer
+            intensity = intensity[buffer:-buffer, buffer:-buffer]
+            tile = tile[:, buffer:-buffer, buffer:-buffer]
+            mask = mask[buffer:-buffer, buffer:-buffer]
+
+
+    rgb, rmask = rescale_tile(tile, mask, rescale=rescale)
+    rgb = apply_colormap(rgb, color_map)
+
+    if intensity is not None:
+        # Quick check
+        if rgb.shape[0] != 3:
+            raise exceptions.ValidationError("Cannot process tile: intensity image provided, but no RGB data was computed.")
+
+        intensity *= 255.0
+        rgb = hsv_blend(rgb, intensity)
+
+    driver = TILE_FORMATS[ext]
+
+    # JPEG has no transparency, tiles with nodata values are sent as PNG
+    if driver == 'jpeg' and rmask is not None and not rmask.all():
+        driver = 'png'
+
+    options = {**img_profiles.get(driver, {}), **settings.TILE_ENCODING_OPTIONS.get(driver, {})}
+    img = array_to_image(rgb, rmask, img_format=driver, **options)
+
+    return img
 
+def get_tile(task, raster_path, tile_type, z, x, y, scale, ext, params, tile_key=None):
+    """
+    Get a tile image from the tile cache, rendering it (and storing it in the cache) if needed
+    :param tile_key: tile cache key, if already computed
+    :return: encoded image (bytes)
+    """
+    if tile_cache.is_enabled():
+        if tile_key is None:
+            tile_key = tile_cache.get_cache_key(raster_path, tile_type, z, x, y, scale, ext, params)
 
-        rgb, rmask = rescale_tile(tile, mask, rescale=rescale)
-        rgb = apply_colormap(rgb, color_map)
+        cached_tile = tile_cache.get_tile(task, tile_type, tile_key, ext)
+        if cached_tile is not None:
+            return cached_tile
 
-        if intensity is not None:
-            # Quick check
-            if rgb.shape[0] != 3:
-                raise exceptions.ValidationError("Cannot process tile: intensity image provided, but no RGB data was computed.")
+    img = render_tile(raster_path, tile_type, z, x, y, scale, ext, params)
+
+    if tile_cache.is_enabled():
+        tile_cache.set_tile(task, tile_type, tile_key, ext, img)
+
+    return img
+
+class Tiles(TaskNestedView):
+    cache_task_access = True
+
+    def get(self, request, pk=None, project_pk=None, tile_type="", z="", x="", y="", scale=1, ext="png"):
+        """
+        Get a tile image
+        """
+        task = self.get_and_check_task(request, pk)
+
+        z = int(z)
+        x = int(x)
+        y = int(y)
+
+        scale = int(scale)
+
+        params = get_tile_params(tile_type, self.request.query_params)
+
+        url = get_raster_path(task, tile_type)
+
+        if not os.path.isfile(url):
+            raise exceptions.NotFound()
+
+        tile_key = tile_cache.get_cache_key(url, tile_type, z, x, y, scale, ext, params)
+
+        # Tiles never change unless the raster changes
+        etag = '"{}"'.format(tile_key)
+        last_modified = int(os.path.getmtime(url))
+        response = not_modified_response(request, task, etag, last_modified)
+        if response is not None:
+            return response
+
+        img = get_tile(task, url, tile_type, z, x, y, scale, ext, params, tile_key)
+
+        return with_cache_headers(HttpResponse(img, content_type=get_image_content_type(img)),
+                                  task, etag, last_modified)
+
+class TilesBatch(TaskNestedView):
+    cache_task_access = True
+
+    def get(self, request, pk=None, project_pk=None, tile_type=""):
+        """
+        Get multiple tile images in a single multipart/mixed response.
+        Tiles are specified with the "tiles" query parameter as a comma separated
+        list of z/x/y values. Each part has an X-Tile header with the tile's z/x/y
+        and an X-Tile-Status header (200, or 404 for tiles outside of the raster).
+        """
+        task = self.get_and_check_task(request, pk)
+
+        tiles = []
+        for t in self.request.query_params.get('tiles', '').split(','):
+            m = re.match(r"^(\d+)/(\d+)/(\d+)$", t.strip())
+            if m is None:
+                raise exceptions.ValidationError("Invalid tiles value: {}".format(t))
+            tiles.append(tuple(map(int, m.groups())))
+
+        if len(tiles) > MAX_BATCH_TILES:
+            raise exceptions.ValidationError("Too many tiles (max {})".format(MAX_BATCH_TILES))
+
+        try:
+            scale = int(self.request.query_params.get('scale', 1))
+        except ValueError:
+            raise exceptions.ValidationError("Invalid scale value")
+        if scale < 1 or scale > 4:
+            raise exceptions.ValidationError("Invalid scale value")
+
+        ext = get_tile_format(tile_type, self.request.query_params)
+        params = get_tile_params(tile_type, self.request.query_params)
+
+        url = get_raster_path(task, tile_type)
+
+        if not os.path.isfile(url):
+            raise exceptions.NotFound()
+
+        boundary = uuid.uuid4().hex
+        parts = []
+        for z, x, y in tiles:
+            try:
+                img = get_tile(task, url, tile_type, z, x, y, scale, ext, params)
+                headers = 'Content-Type: {}\r\nContent-Length: {}\r\nX-Tile: {}/{}/{}\r\nX-Tile-Status: 200'.format(
+                    get_image_content_type(img), len(img), z, x, y)
+            except exceptions.NotFound:
+                img = b''
+                headers = 'Content-Length: 0\r\nX-Tile: {}/{}/{}\r\nX-Tile-Status: 404'.format(z, x, y)
 
-            intensity = intensity * 255.0
-            rgb = hsv_blend(rgb, intensity)
+            parts.append('--{}\r\n{}\r\n\r\n'.format(boundary, headers).encode('ascii') + img + b'\r\n')
+        parts.append('--{}--\r\n'.format(boundary).encode('ascii'))
 
-        options = img_profiles.get(driver, {})
-        return HttpResponse(
-            array_to_image(rgb, rmask, img_format=driver, **options),
-            content_type="image/{}".format(ext)
-        )
+        return HttpResponse(b''.join(parts), content_type='multipart/mixed; boundary={}'.format(boundary))
 
 class Export(TaskNestedView):
     def post(self, request, pk=None, project_pk=None):
@@ -439,7 +680,7 @@ class Export(TaskNestedView):
             raise exceptions.ValidationError("You need to specify a bands parameter")
 
         try:
-            expr, _ = lookup_formula(formula, bands)
+            expr = lookup_compiled_formula(formula, bands).expr
         except ValueError as e:
             raise exceptions.ValidationError(str(e))
 
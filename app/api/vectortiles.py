@@ -0,0 +1,42 @@
+import os
+
+from django.http import HttpResponse
+from rest_framework import exceptions
+
+from app.vector_tiles import get_shots_index, encode_point_layer, vector_index_path, MVT_CONTENT_TYPE, MAX_ZOOM
+from webodm import settings
+from .common import get_file_validators, get_not_modified_response, set_cache_headers
+from .tasks import TaskNestedView
+
+
+class ShotsTiles(TaskNestedView):
+    cache_task_access = True
+
+    def get(self, request, pk=None, project_pk=None, z="", x="", y=""):
+        """
+        Get a Mapbox Vector Tile with the camera shots of a task
+        (a "shots" layer of points, with the same properties as shots.geojson)
+        """
+        task = self.get_and_check_task(request, pk)
+
+        z = int(z)
+        x = int(x)
+        y = int(y)
+
+        if z > MAX_ZOOM or x >= 2 ** z or y >= 2 ** z:
+            raise exceptions.NotFound()
+
+        index = get_shots_index(task)
+        if index is None:
+            raise exceptions.NotFound()
+
+        etag, last_modified = get_file_validators(vector_index_path(task, "shots.json"), z, x, y)
+        response = get_not_modified_response(request, etag, last_modified, task.public, settings.TILE_HTTP_MAX_AGE)
+        if response is not None:
+            return response
+
+        points = index.query(z, x, y)
+        data = encode_point_layer("shots", points) if len(points) > 0 else b''
+
+        return set_cache_headers(HttpResponse(data, content_type=MVT_CONTENT_TYPE),
+                                 etag, last_modified, task.public, settings.TILE_HTTP_MAX_AGE)
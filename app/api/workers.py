@@ -9,6 +9,7 @@ from rest_framework import status, permissions
 from django.http import FileResponse
 from django.http import HttpResponse
 from wsgiref.util import FileWrapper
+from .common import get_offloaded_file_response
 
 class CheckTask(APIView):
     permission_classes = (permissions.AllowAny,)
@@ -17,7 +18,14 @@ class CheckTask(APIView):
         res = TestSafeAsyncResult(celery_task_id)
 
         if not res.ready():
-            return Response({'ready': False}, status=status.HTTP_200_OK)
+            data = {'ready': False}
+
+            # Tasks can report their progress via update_state(meta={'progress': ...})
+            info = getattr(res, 'info', None)
+            if isinstance(info, dict) and 'progress' in info:
+                data['progress'] = info['progress']
+
+            return Response(data, status=status.HTTP_200_OK)
         else:
             result = res.get()
 
@@ -56,20 +64,23 @@ class GetTaskResult(APIView):
             filename = request.query_params.get('filename', os.path.basename(file))
             filesize = os.stat(file).st_size
 
-            f = open(file, "rb")
+            response = get_offloaded_file_response(file)
+
+            if response is None:
+                f = open(file, "rb")
 
-            # More than 100mb, normal http response, otherwise stream
-            # Django docs say to avoid streaming when possible
-            stream = filesize > 1e8
-            if stream:
-                response = FileResponse(f)
-            else:
-                response = HttpResponse(FileWrapper(f),
-                                        content_type=(mimetypes.guess_type(filename)[0] or "application/zip"))
+                # More than 100mb, normal http response, otherwise stream
+                # Django docs say to avoid streaming when possible
+                stream = filesize > 1e8
+                if stream:
+                    response = FileResponse(f)
+                else:
+                    response = HttpResponse(FileWrapper(f),
+                                            content_type=(mimetypes.guess_type(filename)[0] or "application/zip"))
+                response['Content-Length'] = filesize
 
             response['Content-Type'] = mimetypes.guess_type(filename)[0] or "application/zip"
             response['Content-Disposition'] = "attachment; filename={}".format(filename)
-            response['Content-Length'] = filesize
 
             return response
         elif output is not None:
@@ -0,0 +1,129 @@
+import os
+import json
+import tempfile
+
+# The byte offset of every INDEX_INTERVAL-th line is stored in the index
+INDEX_INTERVAL = 1000
+
+
+class Console:
+    """
+    Append-only console output stored in a file.
+    An index file (<file>.idx) keeps track of the number of lines and of the byte offset
+    of every INDEX_INTERVAL-th line, so that appending to the output and reading
+    it from a certain line on don't require reading the whole file.
+    """
+    def __init__(self, file):
+        self.file = file
+        self.index_file = file + ".idx"
+
+    def __str__(self):
+        return self.output()
+
+    def append(self, text):
+        """
+        Append text to the output
+        """
+        data = text.encode('utf-8')
+        if not data:
+            return
+
+        index = self.read_index()
+
+        os.makedirs(os.path.dirname(self.file), exist_ok=True)
+        with open(self.file, 'ab') as f:
+            f.write(data)
+
+        self.index_data(index, data)
+        self.write_index(index)
+
+    def reset(self, text=""):
+        """
+        Replace the output
+        """
+        os.makedirs(os.path.dirname(self.file), exist_ok=True)
+        data = text.encode('utf-8')
+        with open(self.file, 'wb') as f:
+            f.write(data)
+
+        index = self.empty_index()
+        self.index_data(index, data)
+        self.write_index(index)
+
+    def line_count(self):
+        """
+        :return: number of lines, as returned by splitting the output on newlines
+            (0 if the output is empty)
+        """
+        index = self.read_index()
+        return index['newlines'] + 1 if index['size'] > 0 else 0
+
+    def output(self, line=0):
+        """
+        :param line: first line to return
+        :return: output starting from line
+        """
+        index = self.read_index()
+        if index['size'] == 0:
+            return ""
+
+        line = max(0, line)
+        checkpoint = min(line // INDEX_INTERVAL, len(index['offsets']) - 1)
+
+        with open(self.file, 'rb') as f:
+            f.seek(index['offsets'][checkpoint])
+            for _ in range(line - checkpoint * INDEX_INTERVAL):
+                if not f.readline():
+                    break
+
+            # Don't read text appended after the index was read
+            data = f.read(max(0, index['size'] - f.tell()))
+
+        return data.decode('utf-8', errors='replace')
+
+    def empty_index(self):
+        return {'size': 0, 'newlines': 0, 'offsets': [0]}
+
+    def index_data(self, index, data):
+        """
+        Update an index with data appended to the output
+        """
+        pos = data.find(b'\n')
+        while pos != -1:
+            index['newlines'] += 1
+            if index['newlines'] % INDEX_INTERVAL == 0:
+                index['offsets'].append(index['size'] + pos + 1)
+            pos = data.find(b'\n', pos + 1)
+
+        index['size'] += len(data)
+
+    def read_index(self):
+        """
+        :return: the index of the output, rebuilding it if it is missing or out of date
+        """
+        size = os.path.getsize(self.file) if os.path.isfile(self.file) else 0
+
+        try:
+            with open(self.index_file, 'r') as f:
+                index = json.load(f)
+            if index['size'] == size:
+                return index
+        except (OSError, ValueError, KeyError):
+            pass
+
+        index = self.empty_index()
+        if size > 0:
+            with open(self.file, 'rb') as f:
+                while index['size'] < size:
+                    chunk = f.read(min(1024 * 1024, size - index['size']))
+                    if not chunk:
+                        break
+                    self.index_data(index, chunk)
+
+        return index
+
+    def write_index(self, index):
+        fd, tmp_file = tempfile.mkstemp(suffix='.tmp', dir=os.path.dirname(self.index_file))
+        with os.fdopen(fd, 'w') as f:
+            json.dump(index, f)
+        os.replace(tmp_file, self.index_file)
@@ -1,4 +1,5 @@
 import os
+import hashlib
 import logging
 import tempfile
 import shutil
@@ -6,26 +7,58 @@ import rasterio
 import re
 import subprocess
 from pipes import quote
+from functools import lru_cache
 from rio_cogeo.cogeo import cog_validate, cog_translate
 from rio_tiler.utils import has_alpha_band
 from webodm import settings
 
 logger = logging.getLogger('app.logger')
 
-def valid_cogeo(src_path):
+def get_validation_record_path(src_path):
+    """
+    Path of the file that records that a GeoTIFF was found to be a valid cogeo.
+    The path depends on the file's location, size and modification time,
+    so that changed files are validated again.
+    """
+    st = os.stat(src_path)
+    key = hashlib.sha1("|".join(map(str, [os.path.realpath(src_path), st.st_ino, st.st_size, st.st_mtime_ns]))
+                       .encode('utf-8')).hexdigest()
+    return os.path.join(settings.COGEO_VALIDATION_CACHE_DIR, key[:2], key)
+
+
+def valid_cogeo(src_path, use_cache=False):
     """
     Validate a Cloud Optimized GeoTIFF
     :param src_path: path to GeoTIFF
+    :param use_cache: skip the validation if the file was previously found to be valid (and has not changed since)
     :return: true if the GeoTIFF is a cogeo, false otherwise
     """
+    record_path = None
+    if use_cache:
+        try:
+            record_path = get_validation_record_path(src_path)
+            if os.path.isfile(record_path):
+                return True
+        except OSError as e:
+            logger.warning("Cannot check cogeo validation record for %s: %s" % (src_path, str(e)))
+
     try:
         from app.vendor.validate_cloud_optimized_geotiff import validate
         warnings, errors, details = validate(src_path, full_check=True)
-        return not errors and not warnings
+        valid = not errors and not warnings
     except ModuleNotFoundError:
         logger.warning("Using legacy cog_validate (osgeo.gdal package not found)")
         # Legacy
-        return cog_validate(src_path, strict=True)
+        valid = cog_validate(src_path, strict=True)
+
+    if valid and record_path is not None:
+        try:
+            os.makedirs(os.path.dirname(record_path), exist_ok=True)
+            open(record_path, 'w').close()
+        except OSError as e:
+            logger.warning("Cannot record cogeo validation for %s: %s" % (src_path, str(e)))
+
+    return valid
 
 
 def assure_cogeo(src_path):
@@ -41,7 +74,7 @@ def assure_cogeo(src_path):
         logger.warning("Cannot validate cogeo: %s (file does not exist)" % src_path)
         return
 
-    if valid_cogeo(src_path):
+    if valid_cogeo(src_path, use_cache=True):
         return
 
     # Not a cogeo
@@ -70,9 +103,11 @@ def assure_cogeo(src_path):
     else:
         return make_cogeo_gdal(src_path)
 
+@lru_cache(maxsize=1)
 def get_gdal_version():
     # Bit of a hack without installing 
     # python bindings
+    # (the result is computed once per process)
     gdal_translate = shutil.which('gdal_translate')
     if not gdal_translate:
         return None
@@ -0,0 +1,89 @@
+import os
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import rasterio
+from rasterio.errors import RasterioIOError
+
+from webodm import settings
+
+logger = logging.getLogger('app.logger')
+
+
+class DatasetPool(threading.local):
+    """
+    Pool of open rasterio dataset handles, keyed by raster path.
+    Opening a (large) GeoTIFF requires GDAL to parse its headers and IFDs,
+    so we keep handles open and reuse them across requests. Handles are
+    invalidated when the file on disk changes (inode, mtime or size) and
+    the least recently used handles are closed when more than max_open
+    datasets are open.
+
+    Dataset handles are not safe to share across threads, so each
+    thread gets its own pool.
+    """
+    def __init__(self, max_open=None):
+        self.max_open = max_open if max_open is not None else settings.DATASET_POOL_MAX_OPEN
+        self.datasets = OrderedDict()
+
+    def get(self, path):
+        """
+        :param path: path to raster
+        :return: an open rasterio.io.DatasetReader (do not close it)
+        """
+        st = os.stat(path)
+        identity = (st.st_ino, st.st_mtime_ns, st.st_size)
+
+        entry = self.datasets.get(path)
+        if entry is not None:
+            if entry[0] == identity and not entry[1].closed:
+                self.datasets.move_to_end(path)
+                return entry[1]
+            else:
+                # File has changed, reopen
+                self.evict(path)
+
+        src = rasterio.open(path, "r")
+        self.datasets[path] = (identity, src)
+
+        while len(self.datasets) > self.max_open:
+            self.evict(next(iter(self.datasets)))
+
+        return src
+
+    def evict(self, path):
+        entry = self.datasets.pop(path, None)
+        if entry is not None:
+            try:
+                entry[1].close()
+            except Exception as e:
+                logger.warning("Cannot close dataset {}: {}".format(path, str(e)))
+
+    def clear(self):
+        for path in list(self.datasets):
+            self.evict(path)
+
+
+pool = DatasetPool()
+
+
+@contextmanager
+def open_dataset(path):
+    """
+    Drop-in replacement for rasterio.open(path) for read-only access
+    that reuses pooled dataset handles. The handle is not closed on exit,
+    unless an I/O error happens while using it.
+    """
+    if settings.DATASET_POOL_MAX_OPEN <= 0:
+        with rasterio.open(path, "r") as src:
+            yield src
+        return
+
+    src = pool.get(path)
+    try:
+        yield src
+    except RasterioIOError:
+        pool.evict(path)
+        raise
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import os
+
+from django.db import migrations
+from webodm import settings
+
+
+def console_output_path(task):
+    return os.path.join(settings.MEDIA_ROOT, "project", str(task.project_id), "task", str(task.id),
+                        "data", "console_output.txt")
+
+
+def dump_console_outputs(apps, schema_editor):
+    Task = apps.get_model('app', 'Task')
+
+    for task in Task.objects.only('id', 'project_id', 'console_output').iterator():
+        if task.console_output:
+            # The index of the output is built the first time it is read
+            path = console_output_path(task)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(task.console_output.encode('utf-8'))
+
+
+def load_console_outputs(apps, schema_editor):
+    Task = apps.get_model('app', 'Task')
+
+    for task in Task.objects.only('id', 'project_id').iterator():
+        path = console_output_path(task)
+        if os.path.isfile(path):
+            with open(path, 'rb') as f:
+                task.console_output = f.read().decode('utf-8', errors='replace')
+            task.save(update_fields=['console_output'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0030_assure_cogeo'),
+    ]
+
+    operations = [
+        migrations.RunPython(dump_console_outputs, load_console_outputs),
+        migrations.RemoveField(
+            model_name='task',
+            name='console_output',
+        ),
+    ]
@@ -12,6 +12,7 @@ import piexif
 import re
 
 import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import requests
 from PIL import Image
@@ -24,18 +25,24 @@ from django.db import models
 from django.db import transaction
 from django.db import connection
 from django.utils import timezone
+from django.utils.crypto import salted_hmac
 from urllib3.exceptions import ReadTimeoutError
 
 from app import pending_actions
 from django.contrib.gis.db.models.fields import GeometryField
 
 from app.cogeo import assure_cogeo
+from app.tile_cache import clear_tile_cache
+from app.raster_stats import get_raster_stats, clear_raster_stats
+from app.vector_tiles import build_point_index, vector_index_path
+from app.zip_utils import extract_zip, download_and_extract_zip, RangeRequestsNotSupported
 from app.testwatch import testWatch
 from nodeodm import status_codes
 from nodeodm.models import ProcessingNode
 from pyodm.exceptions import NodeResponseError, NodeConnectionError, NodeServerError, OdmError
 from webodm import settings
 from app.classes.gcp import GCPFile
+from app.classes.console import Console
 from .project import Project
 
 from functools import partial
@@ -213,6 +220,17 @@ class Task(models.Model):
 
     TASK_PROGRESS_LAST_VALUE = 0.85
 
+    # Tile query parameters used by the map viewer when it first displays
+    # a layer of each type (these are also the tiles pre-rendered by app.tile_seeding)
+    MAP_TILE_PARAMS = {
+        'plant': {'formula': 'NDVI', 'bands': 'RGN', 'color_map': 'rdylgn'},
+        'dsm': {'hillshade': '6', 'color_map': 'jet'},
+        'dtm': {'hillshade': '6', 'color_map': 'jet'},
+    }
+
+    # Fields updated when the status of a task is retrieved from its processing node
+    STATUS_FIELDS = ['processing_time', 'status', 'running_progress', 'last_error']
+
     id = models.UUIDField(primary_key=True, default=uuid_module.uuid4, unique=True, serialize=False, editable=False)
 
     uuid = models.CharField(max_length=255, db_index=True, default='', blank=True, help_text="Identifier of the task (as returned by OpenDroneMap's REST API)")
@@ -225,7 +243,6 @@ class Task(models.Model):
     last_error = models.TextField(null=True, blank=True, help_text="The last processing error received")
     options = fields.JSONField(default=dict, blank=True, help_text="Options that are being used to process this task", validators=[validate_task_options])
     available_assets = fields.ArrayField(models.CharField(max_length=80), default=list, blank=True, help_text="List of available assets to download")
-    console_output = models.TextField(null=False, default="", blank=True, help_text="Console output of the OpenDroneMap's process")
 
     orthophoto_extent = GeometryField(null=True, blank=True, srid=4326, help_text="Extent of the orthophoto created by OpenDroneMap")
     dsm_extent = GeometryField(null=True, blank=True, srid=4326, help_text="Extent of the DSM created by OpenDroneMap")
@@ -300,8 +317,12 @@ class Task(models.Model):
             self.move_assets(self.__original_project_id, self.project.id)
             self.__original_project_id = self.project.id
 
-        # Autovalidate on save
-        self.full_clean()
+        # Autovalidate on save (only the fields being saved, if update_fields is set)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            self.full_clean(exclude=[f.name for f in self._meta.fields if f.name not in update_fields and f.attname not in update_fields])
+        else:
+            self.full_clean()
 
         super(Task, self).save(*args, **kwargs)
 
@@ -311,6 +332,36 @@ class Task(models.Model):
         """
         return self.task_path("assets", *args)
 
+    def get_webhook_token(self):
+        """
+        :return: secret token that processing nodes use to notify status changes of this task
+        """
+        return salted_hmac("app.models.task.webhook", str(self.id)).hexdigest()
+
+    def get_webhook_url(self):
+        """
+        :return: URL that processing nodes can call when the status of this task changes
+            or None if TASK_WEBHOOK_BASE_URL is not set
+        """
+        if not settings.TASK_WEBHOOK_BASE_URL:
+            return None
+
+        return "{}/api/projects/{}/tasks/{}/webhook/?token={}".format(settings.TASK_WEBHOOK_BASE_URL.rstrip("/"),
+                                                                     self.project.id, self.id, self.get_webhook_token())
+
+    def data_path(self, *args):
+        """
+        Get a path relative to the place where task data (other than assets) is stored
+        """
+        return self.task_path("data", *args)
+
+    @property
+    def console(self):
+        """
+        Console output of the OpenDroneMap's process
+        """
+        return Console(self.data_path("console_output.txt"))
+
     def task_path(self, *args):
         """
         Get path relative to the root task directory
@@ -361,8 +412,7 @@ class Task(models.Model):
             raise FileNotFoundError("{} is not a valid asset".format(asset))
 
     def handle_import(self):
-        self.console_output += "Importing assets...\n"
-        self.save()
+        self.console.append("Importing assets...\n")
 
         zip_path = self.assets_path("all.zip")
 
@@ -414,7 +464,7 @@ class Task(models.Model):
 
         self.pending_action = None
         self.processing_time = 0
-        self.save()
+        self.save(update_fields=['images_count', 'pending_action', 'processing_time'])
 
     def process(self):
         """
@@ -433,7 +483,7 @@ class Task(models.Model):
                 self.refresh_from_db()
                 self.resize_gcp(resized_images)
                 self.pending_action = None
-                self.save()
+                self.save(update_fields=['pending_action'])
 
             if self.auto_processing_node and not self.status in [status_codes.FAILED, status_codes.CANCELED]:
                 # No processing node assigned and need to auto assign
@@ -445,7 +495,7 @@ class Task(models.Model):
                         self.processing_node.save()
 
                         logger.info("Automatically assigned processing node {} to {}".format(self.processing_node, self))
-                        self.save()
+                        self.save(update_fields=['processing_node'])
 
                 # Processing node assigned, but is offline and no errors
                 if self.processing_node and not self.processing_node.is_online():
@@ -457,7 +507,7 @@ class Task(models.Model):
                         self.uuid = ''
                         self.processing_node = None
                         self.status = None
-                        self.save()
+                        self.save(update_fields=['uuid', 'processing_node', 'status'])
 
                     elif self.status == status_codes.RUNNING:
                         # Task was running and processing node went offline
@@ -490,7 +540,8 @@ class Task(models.Model):
 
                     # This takes a while
                     try:
-                        uuid = self.processing_node.process_new_task(images, self.name, self.options, callback)
+                        uuid = self.processing_node.process_new_task(images, self.name, self.options, callback,
+                                                                     webhook=self.get_webhook_url())
                     except NodeConnectionError as e:
                         # If we can't create a task because the node is offline
                         # We want to fail instead of trying again
@@ -500,7 +551,7 @@ class Task(models.Model):
                     self.refresh_from_db()
                     self.upload_progress = 1.0
                     self.uuid = uuid
-                    self.save()
+                    self.save(update_fields=['upload_progress', 'uuid'])
 
                     # TODO: log process has started processing
 
@@ -518,12 +569,12 @@ class Task(models.Model):
 
                         self.status = status_codes.CANCELED
                         self.pending_action = None
-                        self.save()
+                        self.save(update_fields=['status', 'pending_action'])
                     else:
                         # Tasks with no processing node or UUID need no special action
                         self.status = status_codes.CANCELED
                         self.pending_action = None
-                        self.save()
+                        self.save(update_fields=['status', 'pending_action'])
 
                 elif self.pending_action == pending_actions.RESTART:
                     logger.info("Restarting {}".format(self))
@@ -566,13 +617,15 @@ class Task(models.Model):
                             self.options = list(filter(lambda d: d['name'] != 'rerun-from', self.options))
                             self.upload_progress = 0
 
-                        self.console_output = ""
+                        clear_tile_cache(self)
+                        self.console.reset()
                         self.processing_time = -1
                         self.status = None
                         self.last_error = None
                         self.pending_action = None
                         self.running_progress = 0
-                        self.save()
+                        self.save(update_fields=['uuid', 'options', 'upload_progress', 'processing_time', 'status',
+                                                 'last_error', 'pending_action', 'running_progress'])
                     else:
                         raise NodeServerError("Cannot restart a task that has no processing node")
 
@@ -597,10 +650,7 @@ class Task(models.Model):
                 # Need to update status (first time, queued or running?)
                 if self.uuid and self.status in [None, status_codes.QUEUED, status_codes.RUNNING]:
                     # Update task info from processing node
-                    if not self.console_output:
-                        current_lines_count = 0
-                    else:
-                        current_lines_count = len(self.console_output.split("\n"))
+                    current_lines_count = self.console.line_count()
 
                     info = self.processing_node.get_task_info(self.uuid, current_lines_count)
 
@@ -608,7 +658,7 @@ class Task(models.Model):
                     self.status = info.status.value
 
                     if len(info.output) > 0:
-                        self.console_output += "\n".join(info.output) + '\n'
+                        self.console.append("\n".join(info.output) + '\n')
 
                     # Update running progress
                     self.running_progress = (info.progress / 100.0) * self.TASK_PROGRESS_LAST_VALUE
@@ -646,35 +696,55 @@ class Task(models.Model):
                                         self.TASK_PROGRESS_LAST_VALUE + (float(progress) / 100.0) * 0.1))
                                     last_update = time.time()
 
+                            # Extract members while the archive is being downloaded, if the node supports it
+                            pipelined = settings.TASK_ASSETS_PIPELINED_DOWNLOAD
+
                             while not extracted:
                                 last_update = 0
-                                logger.info("Downloading all.zip for {}".format(self))
+                                parallel_downloads = max(1, int(16 / (2 ** retry_num)))
+                                all_zip_path = self.assets_path("all.zip")
+
+                                try:
+                                    if pipelined:
+                                        logger.info("Downloading and extracting all.zip for {}".format(self))
+
+                                        try:
+                                            self.extract_assets_and_complete(download_url=self.processing_node.get_task_assets_url(self.uuid),
+                                                                             parallel_downloads=parallel_downloads)
+                                        except RangeRequestsNotSupported:
+                                            logger.info("{} does not support range requests, downloading all.zip before extracting it".format(self.processing_node))
+                                            pipelined = False
+                                            continue
+                                        except requests.exceptions.RequestException as e:
+                                            raise NodeConnectionError(str(e))
+                                    else:
+                                        logger.info("Downloading all.zip for {}".format(self))
 
-                                # Download all assets
-                                zip_path = self.processing_node.download_task_assets(self.uuid, assets_dir, progress_callback=callback, parallel_downloads=max(1, int(16 / (2 ** retry_num))))
+                                        # Download all assets
+                                        zip_path = self.processing_node.download_task_assets(self.uuid, assets_dir, progress_callback=callback, parallel_downloads=parallel_downloads)
 
-                                # Rename to all.zip
-                                all_zip_path = self.assets_path("all.zip")
-                                os.rename(zip_path, all_zip_path)
+                                        # Rename to all.zip
+                                        os.rename(zip_path, all_zip_path)
 
-                                logger.info("Extracting all.zip for {}".format(self))
+                                        logger.info("Extracting all.zip for {}".format(self))
+
+                                        self.extract_assets_and_complete()
 
-                                try:
-                                    self.extract_assets_and_complete()
                                     extracted = True
                                 except zipfile.BadZipFile:
                                     if retry_num < 5:
                                         logger.warning("{} seems corrupted. Retrying...".format(all_zip_path))
                                         retry_num += 1
-                                        os.remove(all_zip_path)
+                                        if os.path.exists(all_zip_path):
+                                            os.remove(all_zip_path)
                                     else:
                                         raise NodeServerError("Invalid zip file")
                         else:
                             # FAILED, CANCELED
-                            self.save()
+                            self.save(update_fields=self.STATUS_FIELDS)
                     else:
                         # Still waiting...
-                        self.save()
+                        self.save(update_fields=self.STATUS_FIELDS)
 
         except (NodeServerError, NodeResponseError) as e:
             self.set_failure(str(e))
@@ -684,22 +754,19 @@ class Task(models.Model):
             # Task was interrupted during image resize / upload
             logger.warning("{} interrupted".format(self, str(e)))
 
-    def extract_assets_and_complete(self):
+    def extract_assets_and_complete(self, download_url=None, parallel_downloads=16):
         """
         Extracts assets/all.zip, populates task fields where required and assure COGs
-        It will raise a zipfile.BadZipFile exception is the archive is corrupted.
+        It will raise a zipfile.BadZipFile exception is the archive is corrupted
+        and a TaskInterruptedException if the task is canceled during extraction.
+        :param download_url: if set, all.zip is downloaded from this URL while it is being extracted
+            (raises RangeRequestsNotSupported if the server does not support range requests)
+        :param parallel_downloads: number of concurrent downloads when download_url is set
         :return:
         """
         assets_dir = self.assets_path("")
         zip_path = self.assets_path("all.zip")
 
-        # Extract from zip
-        with zipfile.ZipFile(zip_path, "r") as zip_h:
-            zip_h.extractall(assets_dir)
-
-        logger.info("Extracted all.zip for {}".format(self))
-
-        # Populate *_extent fields
         extent_fields = [
             (os.path.realpath(self.assets_path("odm_orthophoto", "odm_orthophoto.tif")),
              'orthophoto_extent'),
@@ -708,16 +775,74 @@ class Task(models.Model):
             (os.path.realpath(self.assets_path("odm_dem", "dtm.tif")),
              'dtm_extent'),
         ]
+        raster_paths = [raster_path for raster_path, _ in extent_fields]
+
+        def assure_cogeo_safe(raster_path):
+            try:
+                assure_cogeo(raster_path)
+            except IOError as e:
+                logger.warning("Cannot create Cloud Optimized GeoTIFF for %s (%s). This will result in degraded visualization performance." % (raster_path, str(e)))
+
+        # Make sure rasters are Cloud Optimized GeoTIFFs
+        # if not, they will be created (concurrently), as soon as they are extracted
+        with ThreadPoolExecutor(max_workers=max(1, min(len(raster_paths), os.cpu_count() or 1))) as cogeo_executor:
+            cogeo_futures = {}
+
+            def member_extracted(path):
+                path = os.path.realpath(path)
+                if path in raster_paths and path not in cogeo_futures:
+                    cogeo_futures[path] = cogeo_executor.submit(assure_cogeo_safe, path)
+
+            # Track extraction progress, check for cancellation
+            # and limit the number of DB updates to every 2 seconds
+            last_update = 0
+            def extract_progress(extracted_bytes, total_bytes):
+                nonlocal last_update
+
+                if time.time() - last_update >= 2 or extracted_bytes == total_bytes:
+                    self.check_if_canceled()
+
+                    # When downloading, progress includes both the download and the extraction
+                    progress = float(extracted_bytes) / max(1, total_bytes)
+                    if download_url is not None:
+                        progress = self.TASK_PROGRESS_LAST_VALUE + progress * 0.12
+                    else:
+                        progress = self.TASK_PROGRESS_LAST_VALUE + 0.1 + progress * 0.02
+
+                    Task.objects.filter(pk=self.id).update(running_progress=progress)
+                    last_update = time.time()
+
+            # Extract from zip
+            try:
+                if download_url is not None:
+                    download_and_extract_zip(download_url, zip_path, assets_dir, threads=parallel_downloads,
+                                             progress_callback=extract_progress, member_callback=member_extracted)
+                else:
+                    extract_zip(zip_path, assets_dir, progress_callback=extract_progress, member_callback=member_extracted)
+            except:
+                for future in cogeo_futures.values():
+                    future.cancel()
+                raise
 
+            logger.info("Extracted all.zip for {}".format(self))
+
+            # Previously rendered tiles and statistics are no longer valid
+            clear_tile_cache(self)
+            clear_raster_stats(self)
+
+            for raster_path in raster_paths:
+                if os.path.exists(raster_path):
+                    member_extracted(raster_path)
+
+            futures = list(cogeo_futures.values())
+            for done, future in enumerate(as_completed(futures), start=1):
+                future.result()
+                Task.objects.filter(pk=self.id).update(running_progress=(
+                    self.TASK_PROGRESS_LAST_VALUE + 0.12 + (float(done) / len(futures)) * 0.02))
+
+        # Populate *_extent fields
         for raster_path, field in extent_fields:
             if os.path.exists(raster_path):
-                # Make sure this is a Cloud Optimized GeoTIFF
-                # if not, it will be created
-                try:
-                    assure_cogeo(raster_path)
-                except IOError as e:
-                    logger.warning("Cannot create Cloud Optimized GeoTIFF for %s (%s). This will result in degraded visualization performance." % (raster_path, str(e)))
-
                 # Read extent and SRID
                 raster = GDALRaster(raster_path)
                 extent = OGRGeometry.from_bbox(raster.extent)
@@ -734,9 +859,24 @@ class Task(models.Model):
 
                 logger.info("Populated extent field with {} for {}".format(raster_path, self))
 
+                # Compute statistics now, so that they are
+                # readily available when the map is first opened
+                try:
+                    get_raster_stats(self, field.replace("_extent", ""), raster_path)
+                except Exception as e:
+                    logger.warning("Cannot compute statistics for %s (%s)" % (raster_path, str(e)))
+
+        # Index camera shots for vector tiles
+        shots_path = self.assets_path(self.ASSETS_MAP['shots.geojson'])
+        if os.path.isfile(shots_path):
+            try:
+                build_point_index(shots_path, vector_index_path(self, "shots.json"))
+            except Exception as e:
+                logger.warning("Cannot index camera shots for %s (%s)" % (self, str(e)))
+
         self.update_available_assets_field()
         self.running_progress = 1.0
-        self.console_output += "Done!\n"
+        self.console.append("Done!\n")
         self.status = status_codes.COMPLETED
         self.save()
 
@@ -761,16 +901,20 @@ class Task(models.Model):
         if 'dtm.tif' in self.available_assets: types.append('dtm')
 
         camera_shots = ''
-        if 'shots.geojson' in self.available_assets: camera_shots = '/api/projects/{}/tasks/{}/download/shots.geojson'.format(self.project.id, self.id)
+        camera_shots_tiles = ''
+        if 'shots.geojson' in self.available_assets:
+            camera_shots = '/api/projects/{}/tasks/{}/download/shots.geojson'.format(self.project.id, self.id)
+            camera_shots_tiles = '/api/projects/{}/tasks/{}/shots/tiles/{{z}}/{{x}}/{{y}}.pbf'.format(self.project.id, self.id)
 
         return {
-            'tiles': [{'url': self.get_tile_base_url(t), 'type': t} for t in types],
+            'tiles': [{'url': self.get_tile_base_url(t), 'type': t, 'params': self.MAP_TILE_PARAMS.get(t, {})} for t in types],
             'meta': {
                 'task': {
                     'id': str(self.id),
                     'project': self.project.id,
                     'public': self.public,
-                    'camera_shots': camera_shots
+                    'camera_shots': camera_shots,
+                    'camera_shots_tiles': camera_shots_tiles
                 }
             }
         }
@@ -818,6 +962,8 @@ class Task(models.Model):
         from app.plugins import signals as plugin_signals
         plugin_signals.task_removing.send_robust(sender=self.__class__, task_id=task_id)
 
+        clear_tile_cache(self)
+
         directory_to_delete = os.path.join(settings.MEDIA_ROOT,
                                            task_directory_path(self.id, self.project.id))
 
@@ -836,7 +982,7 @@ class Task(models.Model):
         self.last_error = error_message
         self.status = status_codes.FAILED
         self.pending_action = None
-        self.save()
+        self.save(update_fields=['last_error', 'status', 'pending_action'])
         
     def find_all_files_matching(self, regex):
         directory = full_task_directory_path(self.id, self.project.id)
@@ -0,0 +1,105 @@
+import os
+import json
+import hashlib
+import logging
+import shutil
+import tempfile
+
+import numpy as np
+from rio_tiler import main
+from rio_tiler.utils import has_alpha_band
+
+from app.dataset_pool import open_dataset
+
+logger = logging.getLogger('app.logger')
+
+STATS_PMIN = 2.0
+STATS_PMAX = 98.0
+
+
+def raster_stats_path(task, *args):
+    """
+    Get a path relative to the place where raster statistics are stored for a task
+    """
+    return task.task_path("cache", "stats", *args)
+
+
+def _json_default(obj):
+    if isinstance(obj, np.generic) or isinstance(obj, np.ndarray):
+        return obj.tolist()
+    raise TypeError("{} is not JSON serializable".format(type(obj)))
+
+
+def compute_raster_stats(raster_path, expr=None, hrange=None):
+    """
+    Compute statistics and histograms for a raster
+    :param raster_path: path to raster
+    :param expr: optional band expression
+    :param hrange: optional histogram range
+    :return: dict with "band_count" and "info" (as returned by rio_tiler's metadata) keys
+    """
+    with open_dataset(raster_path) as src:
+        band_count = src.meta['count']
+        if has_alpha_band(src):
+            band_count -= 1
+
+        nodata = None
+        # Workaround for https://github.com/OpenDroneMap/WebODM/issues/894
+        if band_count > 4:
+            nodata = 0
+
+        info = main.metadata(src, pmin=STATS_PMIN, pmax=STATS_PMAX, histogram_bins=255, histogram_range=hrange, expr=expr, nodata=nodata)
+
+    info.pop('address', None)
+
+    return {
+        'band_count': band_count,
+        'info': info
+    }
+
+
+def get_raster_stats(task, tile_type, raster_path, expr=None, hrange=None):
+    """
+    Get statistics for a task's raster, computing them only if they
+    have not been computed before for the same raster file and expression
+    :return: dict with "band_count" and "info" keys
+    """
+    st = os.stat(raster_path)
+    key = hashlib.sha1("|".join(map(str, [st.st_ino, st.st_mtime_ns, st.st_size,
+                                          expr, hrange]))
+                       .encode('utf-8')).hexdigest()
+    stats_file = raster_stats_path(task, "{}_{}.json".format(tile_type, key))
+
+    try:
+        with open(stats_file, 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        pass
+
+    stats = compute_raster_stats(raster_path, expr, hrange)
+
+    try:
+        stats_dir = os.path.dirname(stats_file)
+        os.makedirs(stats_dir, exist_ok=True)
+
+        fd, tmp_file = tempfile.mkstemp(suffix='.tmp', dir=stats_dir)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(stats, f, default=_json_default)
+        os.replace(tmp_file, stats_file)
+
+        # Return the same values that will be read from cache
+        with open(stats_file, 'r') as f:
+            stats = json.load(f)
+    except OSError as e:
+        logger.warning("Cannot write raster statistics {}: {}".format(stats_file, str(e)))
+
+    return stats
+
+
+def clear_raster_stats(task):
+    """
+    Remove all stored raster statistics for a task
+    """
+    stats_dir = raster_stats_path(task)
+    if os.path.exists(stats_dir):
+        shutil.rmtree(stats_dir, ignore_errors=True)
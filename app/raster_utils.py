@@ -1,24 +1,52 @@
 # Export a raster index after applying a band expression
+import os
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
 import rasterio
-import re
 import numpy as np
-import numexpr as ne
 from rasterio.enums import ColorInterp
 from rio_tiler.utils import has_alpha_band
+from webodm import settings
+from app.api.formulas import compile_expression
+
+# Block size of the output (if the input is not tiled)
+BLOCK_SIZE = 512
+
 
+def export_raster_index(input, expression, output, progress_callback=None, threads=None):
+    """
+    Apply a band expression to a raster and write the result as a float32 GeoTIFF.
+    The raster is processed one block at a time, so that memory usage
+    does not depend on the size of the input. Blocks are read and evaluated
+    by a pool of threads (GDAL and numexpr release the GIL) and written in order.
+    :param progress_callback: optional function called with the progress (0..1) after each block is written
+    :param threads: number of threads (defaults to RASTER_INDEX_EXPORT_THREADS)
+    """
+    if threads is None:
+        threads = settings.RASTER_INDEX_EXPORT_THREADS
+    if threads <= 0:
+        threads = os.cpu_count() or 1
 
-def export_raster_index(input, expression, output):
     with rasterio.open(input) as src:
         profile = src.profile
         profile.update(
             dtype=rasterio.float32,
             count=1,
-            nodata=-9999
+            nodata=-9999,
+            compress='deflate',
+            bigtiff='IF_SAFER'
         )
+        if not profile.get('tiled', False):
+            profile.update(
+                tiled=True,
+                blockxsize=BLOCK_SIZE,
+                blockysize=BLOCK_SIZE
+            )
 
-        bands_names = ["b{}".format(b) for b in tuple(sorted(set(re.findall(r"b(?P<bands>[0-9]{1,2})", expression))))]
-        rgb = expression.split(",")
-        indexes = tuple([int(b.replace("b", "")) for b in bands_names])
+        formula = compile_expression(expression)
+        indexes = formula.indexes
 
         alpha_index = None
         if has_alpha_band(src):
@@ -28,22 +56,68 @@ def export_raster_index(input, expression, output):
             except ValueError:
                 pass
 
-        data = src.read(indexes=indexes, out_dtype=np.float32)
-        arr = dict(zip(bands_names, data))
-        arr = np.array([np.nan_to_num(ne.evaluate(bloc.strip(), local_dict=arr)) for bloc in rgb])
+    # Dataset handles cannot be shared across threads
+    local = threading.local()
+    handles = []
+    handles_lock = threading.Lock()
+
+    def process(window):
+        if not hasattr(local, 'src'):
+            local.src = rasterio.open(input)
+            with handles_lock:
+                handles.append(local.src)
+
+        data = local.src.read(indexes=indexes, window=window, out_dtype=np.float32)
+        return compute_index_block(data, formula, alpha_index is not None)
+
+    try:
+        with rasterio.open(output, 'w', **profile) as dst, ThreadPoolExecutor(max_workers=threads) as executor:
+            # Output blocks match the input's internal tiles when the input is tiled
+            windows = [window for _, window in dst.block_windows(1)]
+
+            # Limit the number of blocks held in memory
+            max_pending = threads * 4
+            pending = deque()
+            written = 0
+
+            def write_next():
+                nonlocal written
+                window, future = pending.popleft()
+                dst.write(future.result(), window=window)
+                written += 1
+                if progress_callback is not None:
+                    progress_callback(written / len(windows))
+
+            for window in windows:
+                pending.append((window, executor.submit(process, window)))
+                if len(pending) >= max_pending:
+                    write_next()
+
+            while pending:
+                write_next()
+    finally:
+        for handle in handles:
+            handle.close()
+
 
-        # Set nodata values
-        index_band = arr[0]
-        if alpha_index is not None:
-            # -1 is the last band = alpha
-            index_band[data[-1] == 0] = -9999
+def compute_index_block(data, formula, has_alpha):
+    """
+    Evaluate a band expression over a block of data
+    :param data: float32 array of the bands referenced in the expression (and alpha, as the last band)
+    :param formula: CompiledFormula
+    :param has_alpha: whether the last band of data is an alpha band
+    :return: float32 array with the results
+    """
+    arr = formula.evaluate(data)
 
-        # Remove infinity values
-        index_band[index_band>1e+30] = -9999
-        index_band[index_band<-1e+30] = -9999
+    # Set nodata values
+    index_band = arr[0]
+    if has_alpha:
+        # -1 is the last band = alpha
+        index_band[data[-1] == 0] = -9999
 
-        # Make sure this is float32
-        arr = arr.astype(np.float32)
+    # Remove infinity values
+    index_band[index_band>1e+30] = -9999
+    index_band[index_band<-1e+30] = -9999
 
-        with rasterio.open(output, 'w', **profile) as dst:
-            dst.write(arr)
+    return arr
@@ -0,0 +1,55 @@
+# Compare the performance of the hillshade and HSV blending
+# kernels used by the tiler against the original double precision implementations
+#
+# Usage: python -m app.scripts.benchmark_hillshade
+
+import timeit
+
+import numpy as np
+
+from app.api.hillshade import LightSource, _vector_magnitude
+from app.api.hsvblend import hsv_blend, rgb_to_hsv, hsv_to_rgb
+
+REPEAT = 50
+
+
+def reference_hillshade(ls, elevation, vert_exag=1, dx=1, dy=1):
+    # Double precision implementation from matplotlib
+    e_dy, e_dx = np.gradient(vert_exag * elevation, -dy, dx)
+    normal = np.empty(elevation.shape + (3,))
+    normal[..., 0] = -e_dx
+    normal[..., 1] = -e_dy
+    normal[..., 2] = 1
+    normal /= _vector_magnitude(normal)
+    return ls.shade_normals(normal)
+
+
+def reference_hsv_blend(rgb, intensity):
+    hsv = rgb_to_hsv(rgb[0], rgb[1], rgb[2])
+    return hsv_to_rgb(np.asarray([hsv[0], hsv[1], intensity]))
+
+
+def benchmark():
+    ls = LightSource(azdeg=315, altdeg=45)
+
+    for size in (256, 512):
+        x, y = np.meshgrid(np.linspace(0, 10, size), np.linspace(0, 10, size))
+        elevation = (np.sin(x) * np.cos(y) * 20 + 150).astype(np.float32)
+        rgb = np.random.randint(0, 256, (3, size, size)).astype(np.uint8)
+        intensity = np.random.rand(size, size).astype(np.float32) * 255.0
+
+        results = [
+            ("hillshade", lambda: reference_hillshade(ls, elevation, vert_exag=3, dx=0.5, dy=0.5),
+                          lambda: ls.hillshade(elevation, vert_exag=3, dx=0.5, dy=0.5)),
+            ("hsv_blend", lambda: reference_hsv_blend(rgb, intensity),
+                          lambda: hsv_blend(rgb, intensity)),
+        ]
+
+        for name, before, after in results:
+            t_before = timeit.timeit(before, number=REPEAT) / REPEAT * 1000
+            t_after = timeit.timeit(after, number=REPEAT) / REPEAT * 1000
+            print("{} {}x{}: {:.2f}ms --> {:.2f}ms ({:.1f}x)".format(name, size, size, t_before, t_after, t_before / t_after))
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -41,7 +41,8 @@ class MapView extends React.Component {
         if (tile.type === type) tiles.push({
           url: tile.url,
           meta: mapItem.meta,
-          type: tile.type
+          type: tile.type,
+          params: tile.params || {}
         });
       });
     });
@@ -1,7 +1,7 @@
 import $ from 'jquery';
 
 export default {
-    waitForCompletion: (celery_task_id, cb, checkUrl = "/api/workers/check/") => {
+    waitForCompletion: (celery_task_id, cb, checkUrl = "/api/workers/check/", progressCb = null) => {
         let errorCount = 0;
         let url = checkUrl + celery_task_id;
 
@@ -15,6 +15,8 @@ export default {
               }else if (result.ready){
                 cb();
               }else{
+                if (progressCb && result.progress !== undefined) progressCb(result.progress);
+
                 // Retry
                 setTimeout(() => check(), 2000);
               }
@@ -61,6 +61,7 @@ export default class LayersControlLayer extends React.Component {
         hillshade: params.hillshade || "",
         histogramLoading: false,
         exportLoading: false,
+        exportProgress: null,
         error: ""
     };
 
@@ -227,7 +228,7 @@ export default class LayersControlLayer extends React.Component {
       
       // Plant health needs to be exported
       if (formula !== "" && algorithms){
-        this.setState({exportLoading: true, error: ""});
+        this.setState({exportLoading: true, exportProgress: null, error: ""});
         
         this.exportReq = $.ajax({
                 type: 'POST',
@@ -241,6 +242,8 @@ export default class LayersControlLayer extends React.Component {
                             this.setState({exportLoading: false});
                             Workers.downloadFile(result.celery_task_id, "odm_orthophoto_" + encodeURIComponent(this.state.formula) + ".tif");
                         }
+                    }, undefined, exportProgress => {
+                        this.setState({exportProgress});
                     });
                 }else if (result.error){
                     this.setState({exportLoading: false, error: result.error});
@@ -257,7 +260,7 @@ export default class LayersControlLayer extends React.Component {
   }
 
   render(){
-    const { colorMap, bands, hillshade, formula, histogramLoading, exportLoading } = this.state;
+    const { colorMap, bands, hillshade, formula, histogramLoading, exportLoading, exportProgress } = this.state;
     const { meta, tmeta } = this;
     const { color_maps, algorithms } = tmeta;
     const algo = this.getAlgorithm(formula);
@@ -333,7 +336,7 @@ export default class LayersControlLayer extends React.Component {
                 <label className="col-sm-3 control-label">Export: </label>
                 <div className="col-sm-9">
                     <button onClick={this.handleExport} disabled={exportLoading} type="button" className="btn btn-sm btn-default">
-                        {exportLoading ? <i className="fa fa-spin fa-circle-notch"/> : <i className="far fa-image fa-fw" />} GeoTIFF
+                        {exportLoading ? <i className="fa fa-spin fa-circle-notch"/> : <i className="far fa-image fa-fw" />} GeoTIFF{exportLoading && exportProgress !== null ? ` (${Math.round(exportProgress * 100)}%)` : ""}
                     </button>
                 </div>
             </div>
@@ -117,16 +117,15 @@ class Map extends React.Component {
       this.tileJsonRequests = [];
 
       async.each(tiles, (tile, done) => {
-        const { url, meta, type } = tile;
+        const { url, meta, type, params } = tile;
         
-        let metaUrl = url + "metadata";
-
-        if (type == "plant") metaUrl += "?formula=NDVI&bands=RGN&color_map=rdylgn";
-        if (type == "dsm" || type == "dtm") metaUrl += "?hillshade=6&color_map=jet";
+        // Default parameters for this layer type are provided by the server
+        // (so that they match the tiles it pre-renders)
+        let metaUrl = Utils.buildUrlWithQuery(url + "metadata", params || {});
 
         this.tileJsonRequests.push($.getJSON(metaUrl)
           .done(mres => {
-            const { scheme, name, maxzoom, statistics } = mres;
+            const { scheme, name, maxzoom } = mres;
 
             const bounds = Leaflet.latLngBounds(
                 [mres.bounds.value.slice(0, 2).reverse(), mres.bounds.value.slice(2, 4).reverse()]
@@ -135,18 +134,11 @@ class Map extends React.Component {
             // Build URL
             let tileUrl = mres.tiles[0];
             
-            // Set rescale
-            if (statistics){
-                const params = Utils.queryParams({search: tileUrl.slice(tileUrl.indexOf("?"))});
-                if (statistics["1"]){
-                    // Add rescale
-                    params["rescale"] = encodeURIComponent(`${statistics["1"]["min"]},${statistics["1"]["max"]}`);              
-                }else{
-                    console.warn("Cannot find min/max statistics for dataset, setting to -1,1");
-                    params["rescale"] = encodeURIComponent("-1,1");
-                }
-                
-                tileUrl = Utils.buildUrlWithQuery(tileUrl, params);
+            // Set rescale (as computed by the server)
+            if (mres.rescale){
+                const query = Utils.queryParams({search: tileUrl.slice(tileUrl.indexOf("?"))});
+                query["rescale"] = encodeURIComponent(mres.rescale);
+                tileUrl = Utils.buildUrlWithQuery(tileUrl, query);
             }
 
             const layer = Leaflet.tileLayer(tileUrl, {
@@ -0,0 +1,122 @@
+import time
+import threading
+from collections import OrderedDict
+
+from django.contrib.auth.models import User
+from django.db.models import signals
+from django.dispatch import receiver
+from guardian.models import UserObjectPermission, GroupObjectPermission
+
+from app.models import Task, Project
+from webodm import settings
+
+
+class TTLCache:
+    """
+    Thread-safe dictionary whose entries expire after ttl seconds.
+    When more than max_entries are stored, the oldest entries are removed.
+    """
+    def __init__(self, ttl, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return default
+
+            expires, value = entry
+            if expires < time.monotonic():
+                del self.entries[key]
+                return default
+
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries.pop(key, None)
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def remove(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def remove_if(self, predicate):
+        with self.lock:
+            for key in [k for k in self.entries if predicate(k)]:
+                del self.entries[key]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+# task id --> Task (with its project)
+tasks = TTLCache(settings.TASK_ACCESS_CACHE_TTL)
+
+# (user id, project id) --> bool
+project_access = TTLCache(settings.TASK_ACCESS_CACHE_TTL)
+
+
+def is_enabled():
+    return settings.TASK_ACCESS_CACHE_TTL > 0
+
+
+def get_task(pk):
+    """
+    Get a task (and its project) for read-only use.
+    The same instance can be shared across requests, so it must not be modified.
+    :raises Task.DoesNotExist, ValidationError
+    """
+    key = str(pk)
+    task = tasks.get(key)
+    if task is None:
+        task = Task.objects.select_related('project').get(pk=pk)
+        if is_enabled():
+            tasks.set(key, task)
+    return task
+
+
+def has_project_access(user, project, perm='view_project'):
+    """
+    :return: True if the user is allowed to view the project
+    """
+    key = (user.pk, project.id)
+    allowed = project_access.get(key)
+    if allowed is None:
+        allowed = not project.deleting and user.has_perm(perm, project)
+        if is_enabled():
+            project_access.set(key, allowed)
+    return allowed
+
+
+# Entries are removed as soon as something changes in this process.
+# Other processes see the change once their entries expire (TASK_ACCESS_CACHE_TTL)
+
+@receiver(signals.post_save, sender=Task, dispatch_uid="task_access_cache_task_changed")
+@receiver(signals.post_delete, sender=Task, dispatch_uid="task_access_cache_task_deleted")
+def task_changed(sender, instance, **kwargs):
+    tasks.remove(str(instance.id))
+
+
+@receiver(signals.post_save, sender=Project, dispatch_uid="task_access_cache_project_changed")
+@receiver(signals.post_delete, sender=Project, dispatch_uid="task_access_cache_project_deleted")
+def project_changed(sender, instance, **kwargs):
+    tasks.clear()
+    project_access.remove_if(lambda k: k[1] == instance.id)
+
+
+@receiver(signals.post_save, sender=UserObjectPermission, dispatch_uid="task_access_cache_user_perm_changed")
+@receiver(signals.post_delete, sender=UserObjectPermission, dispatch_uid="task_access_cache_user_perm_deleted")
+@receiver(signals.post_save, sender=GroupObjectPermission, dispatch_uid="task_access_cache_group_perm_changed")
+@receiver(signals.post_delete, sender=GroupObjectPermission, dispatch_uid="task_access_cache_group_perm_deleted")
+@receiver(signals.m2m_changed, sender=User.groups.through, dispatch_uid="task_access_cache_user_groups_changed")
+@receiver(signals.post_save, sender=User, dispatch_uid="task_access_cache_user_changed")
+def permissions_changed(sender, **kwargs):
+    project_access.clear()
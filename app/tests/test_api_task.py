@@ -12,6 +12,8 @@ import json
 import requests
 from PIL import Image
 from django.contrib.auth.models import User
+from django.http import QueryDict
+from urllib.parse import urlparse
 from rest_framework import status
 from rest_framework.test import APIClient
 
@@ -20,8 +22,11 @@ from django.utils import timezone
 
 from app import pending_actions
 from app.api.formulas import algos, get_camera_filters_for
-from app.api.tiler import ZOOM_EXTRA_LEVELS
+from app.api.tiler import ZOOM_EXTRA_LEVELS, get_raster_path, get_tile_params
 from app.cogeo import valid_cogeo
+from app.raster_stats import raster_stats_path
+from app.tile_seeding import seed_tiles, get_default_tile_params
+from app import tile_cache
 from app.models import Project, Task, ImageUpload
 from app.models.task import task_directory_path, full_task_directory_path, TaskInterruptedException
 from app.plugins.signals import task_completed, task_removed, task_removing
@@ -445,6 +450,9 @@ class TestApiTask(BootTransactionTestCase):
                 self.assertEqual(i.width, 212)
                 self.assertEqual(i.height, 212)
 
+            # Statistics for orthophoto, DSM and DTM have been computed at completion
+            self.assertEqual(len(os.listdir(raster_stats_path(task))), 3)
+
             # Can access tiles.json, bounds and metadata
             for ep in endpoints:
                 for tile_type in tile_types:
@@ -462,12 +470,24 @@ class TestApiTask(BootTransactionTestCase):
             bounds = json.loads(res.content.decode("utf-8"))
             self.assertTrue(len(bounds['bounds']) == 4)
             self.assertTrue(round(bounds['bounds'][0], 7) == -91.9945132)
+            self.assertTrue(res.has_header('ETag'))
+
+            # Bounds do not require the raster (but cannot be revalidated without it)
+            orthophoto_path = task.assets_path("odm_orthophoto", "odm_orthophoto.tif")
+            os.rename(orthophoto_path, orthophoto_path + ".bak")
+            try:
+                res = client.get("/api/projects/{}/tasks/{}/orthophoto/bounds".format(project.id, task.id))
+                self.assertEqual(res.status_code, status.HTTP_200_OK)
+                self.assertEqual(json.loads(res.content.decode("utf-8"))['bounds'], bounds['bounds'])
+                self.assertFalse(res.has_header('ETag'))
+            finally:
+                os.rename(orthophoto_path + ".bak", orthophoto_path)
 
             # Metadata checks for orthophoto
             res = client.get("/api/projects/{}/tasks/{}/orthophoto/metadata".format(project.id, task.id))
             self.assertEqual(res.status_code, status.HTTP_200_OK)
             metadata = json.loads(res.content.decode("utf-8"))
-            fields = ['bounds', 'minzoom', 'maxzoom', 'statistics', 'algorithms', 'color_maps', 'tiles', 'scheme', 'name']
+            fields = ['bounds', 'minzoom', 'maxzoom', 'statistics', 'algorithms', 'color_maps', 'tiles', 'scheme', 'name', 'rescale']
             for f in fields:
                 self.assertTrue(f in metadata)
 
@@ -583,6 +603,23 @@ class TestApiTask(BootTransactionTestCase):
                     self.assertEqual(i.width, 512)
                     self.assertEqual(i.height, 512)
 
+            # Can access tiles in other formats
+            for ext in ['jpg', 'webp']:
+                res = client.get("/api/projects/{}/tasks/{}/orthophoto/tiles/{}.{}".format(project.id, task.id, tile_path['orthophoto'], ext))
+                self.assertEqual(res.status_code, status.HTTP_200_OK)
+                self.assertTrue(res['Content-Type'] in ['image/{}'.format('jpeg' if ext == 'jpg' else ext), 'image/png'])
+
+                with Image.open(io.BytesIO(res.content)) as i:
+                    self.assertEqual(i.width, 256)
+                    self.assertEqual(i.height, 256)
+
+                res = client.get("/api/projects/{}/tasks/{}/orthophoto/tiles.json?tile_format={}".format(project.id, task.id, ext))
+                self.assertEqual(res.status_code, status.HTTP_200_OK)
+                self.assertTrue(json.loads(res.content.decode("utf-8"))['tiles'][0].endswith('.' + ext))
+
+            res = client.get("/api/projects/{}/tasks/{}/orthophoto/tiles.json?tile_format=invalid".format(project.id, task.id))
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
             # Cannot access tile 0/0/0
             res = client.get("/api/projects/{}/tasks/{}/orthophoto/tiles/0/0/0.png".format(project.id, task.id))
             self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
@@ -632,6 +669,152 @@ class TestApiTask(BootTransactionTestCase):
                 res = client.get("/api/projects/{}/tasks/{}/{}/tiles/{}.png?{}".format(project.id, task.id, tile_type, tile_path[tile_type], url))
                 self.assertEqual(res.status_code, sc)
 
+            # Multiple tiles can be requested at once
+            res = client.get("/api/projects/{}/tasks/{}/orthophoto/tiles/batch?tiles={},0/0/0".format(project.id, task.id, tile_path['orthophoto']))
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertTrue(res['Content-Type'].startswith('multipart/mixed'))
+            self.assertTrue("X-Tile: {}\r\nX-Tile-Status: 200".format(tile_path['orthophoto']).encode('ascii') in res.content)
+            self.assertTrue(b"X-Tile: 0/0/0\r\nX-Tile-Status: 404" in res.content)
+            self.assertTrue(b"\x89PNG" in res.content)
+
+            res = client.get("/api/projects/{}/tasks/{}/orthophoto/tiles/batch?tiles={}&tile_format=jpg".format(project.id, task.id, tile_path['orthophoto']))
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+            for tiles in ["", "1/2", "a/b/c", ",".join(["0/0/0"] * 1000)]:
+                res = client.get("/api/projects/{}/tasks/{}/orthophoto/tiles/batch?tiles={}".format(project.id, task.id, tiles))
+                self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+            # Tiles can be pre-rendered into the tile cache
+            tile_cache.clear_tile_cache(task)
+            self.assertTrue(seed_tiles(task, max_zoom=17) > 0)
+
+            # Tiles already in the cache are not rendered again
+            self.assertEqual(seed_tiles(task, max_zoom=17), 0)
+
+            # The tiles requested by the map viewer by default are the pre-rendered ones
+            for map_tile in task.get_map_items()['tiles']:
+                tile_type = map_tile['type']
+                if tile_type not in tile_path:
+                    continue
+
+                # Same requests as Map.jsx
+                query = "&".join("{}={}".format(k, v) for k, v in map_tile['params'].items())
+                res = client.get(map_tile['url'] + "metadata" + ("?" + query if query else ""))
+                self.assertEqual(res.status_code, status.HTTP_200_OK)
+                metadata = json.loads(res.content.decode("utf-8"))
+
+                tile_url = urlparse(metadata['tiles'][0])
+                params = QueryDict(tile_url.query, mutable=True)
+                params['rescale'] = metadata['rescale']
+                self.assertEqual(get_tile_params(tile_type, params), get_tile_params(tile_type, get_default_tile_params(task, tile_type)))
+
+                z, x, y = map(int, tile_path[tile_type].split("/"))
+                while z > 17:
+                    z, x, y = z - 1, x // 2, y // 2
+                ext = tile_url.path.split(".")[-1]
+                key = tile_cache.get_cache_key(get_raster_path(task, tile_type), tile_type, z, x, y, 1, ext, get_tile_params(tile_type, params))
+                self.assertIsNotNone(tile_cache.get_tile(task, tile_type, key, ext))
+
+            # Tiles and assets can be revalidated with conditional requests
+            for url in ["/api/projects/{}/tasks/{}/orthophoto/tiles/{}.png".format(project.id, task.id, tile_path['orthophoto']),
+                        "/api/projects/{}/tasks/{}/orthophoto/tiles.json".format(project.id, task.id),
+                        "/api/projects/{}/tasks/{}/download/orthophoto.tif".format(project.id, task.id)]:
+                res = client.get(url)
+                self.assertEqual(res.status_code, status.HTTP_200_OK)
+                self.assertTrue(res.has_header('ETag'))
+                self.assertTrue(res.has_header('Last-Modified'))
+                self.assertTrue(res['Cache-Control'].startswith('private'))
+
+                res = client.get(url, HTTP_IF_NONE_MATCH=res['ETag'])
+                self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+                res = client.get(url, HTTP_IF_NONE_MATCH='"outdated"')
+                self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+            # Byte ranges can be requested
+            with open(task.assets_path("odm_orthophoto", "odm_orthophoto.tif"), "rb") as f:
+                orthophoto_data = f.read()
+            download_url = "/api/projects/{}/tasks/{}/download/orthophoto.tif".format(project.id, task.id)
+            res = client.get(download_url)
+            self.assertEqual(res['Accept-Ranges'], 'bytes')
+            etag = res['ETag']
+
+            res = client.get(download_url, HTTP_RANGE="bytes=0-99")
+            self.assertEqual(res.status_code, status.HTTP_206_PARTIAL_CONTENT)
+            self.assertEqual(res['Content-Range'], "bytes 0-99/{}".format(len(orthophoto_data)))
+            self.assertEqual(b''.join(res.streaming_content), orthophoto_data[0:100])
+
+            res = client.get(download_url, HTTP_RANGE="bytes=-10")
+            self.assertEqual(res.status_code, status.HTTP_206_PARTIAL_CONTENT)
+            self.assertEqual(b''.join(res.streaming_content), orthophoto_data[-10:])
+
+            res = client.get(download_url, HTTP_RANGE="bytes=0-9,20-29")
+            self.assertEqual(res.status_code, status.HTTP_206_PARTIAL_CONTENT)
+            self.assertTrue(res['Content-Type'].startswith('multipart/byteranges'))
+            body = b''.join(res.streaming_content)
+            self.assertEqual(len(body), int(res['Content-Length']))
+            self.assertTrue(orthophoto_data[0:10] in body and orthophoto_data[20:30] in body)
+
+            res = client.get(download_url, HTTP_RANGE="bytes={}-".format(len(orthophoto_data)))
+            self.assertEqual(res.status_code, status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+
+            # Invalid ranges are ignored
+            res = client.get(download_url, HTTP_RANGE="bytes=invalid")
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+            # Full content is sent if the client's copy is outdated
+            res = client.get(download_url, HTTP_RANGE="bytes=0-99", HTTP_IF_RANGE='"outdated"')
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            res = client.get(download_url, HTTP_RANGE="bytes=0-99", HTTP_IF_RANGE=etag)
+            self.assertEqual(res.status_code, status.HTTP_206_PARTIAL_CONTENT)
+
+            # Downloads can be delegated to the web server
+            try:
+                settings.FILE_SERVING_MODE = 'x-accel-redirect'
+                res = client.get(download_url)
+                self.assertEqual(res.status_code, status.HTTP_200_OK)
+                self.assertEqual(res['X-Accel-Redirect'], "/_protected_media/project/{}/task/{}/assets/odm_orthophoto/odm_orthophoto.tif".format(project.id, task.id))
+                self.assertEqual(res['Content-Type'], "image/tiff")
+                self.assertEqual(len(res.content), 0)
+
+                settings.FILE_SERVING_MODE = 'x-sendfile'
+                res = client.get(download_url)
+                self.assertEqual(res['X-Sendfile'], os.path.realpath(task.assets_path("odm_orthophoto", "odm_orthophoto.tif")))
+            finally:
+                settings.FILE_SERVING_MODE = None
+
+            # Camera shots can be retrieved as vector tiles
+            shots_path = task.assets_path(task.ASSETS_MAP['shots.geojson'])
+            if os.path.exists(shots_path):
+                os.remove(shots_path)
+            shots_url = "/api/projects/{}/tasks/{}/shots/tiles/{}/{}/{}.pbf"
+
+            res = client.get(shots_url.format(project.id, task.id, 0, 0, 0))
+            self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+            os.makedirs(os.path.dirname(shots_path), exist_ok=True)
+            with open(shots_path, 'w') as f:
+                json.dump({
+                    'type': 'FeatureCollection',
+                    'features': [{'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': [-91.99, 46.84]},
+                                  'properties': {'filename': 'DJI_0001.JPG'}}]
+                }, f)
+
+            res = client.get(shots_url.format(project.id, task.id, 0, 0, 0))
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertEqual(res['Content-Type'], 'application/vnd.mapbox-vector-tile')
+            self.assertTrue(b'DJI_0001.JPG' in res.content)
+
+            # Tiles without shots are empty
+            res = client.get(shots_url.format(project.id, task.id, 1, 1, 1))
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertEqual(len(res.content), 0)
+
+            # Out of range tiles cannot be retrieved
+            for z, x, y in [(1, 2, 0), (1, 0, 2), (31, 0, 0), (100000000, 0, 0)]:
+                res = client.get(shots_url.format(project.id, task.id, z, x, y))
+                self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
             # Another user does not have access to the resources
             other_client = APIClient()
             other_client.login(username="testuser2", password="test1234")
@@ -647,6 +830,9 @@ class TestApiTask(BootTransactionTestCase):
                 res = other_client.get("/api/projects/{}/tasks/{}/".format(project.id, task.id))
                 self.assertEqual(res.status_code, expectedStatus)
 
+                res = other_client.get(shots_url.format(project.id, task.id, 0, 0, 0))
+                self.assertEqual(res.status_code, expectedStatus)
+
             accessResources(status.HTTP_404_NOT_FOUND)
 
             # Original owner enables sharing
@@ -658,6 +844,10 @@ class TestApiTask(BootTransactionTestCase):
             # Now other user can acccess resources
             accessResources(status.HTTP_200_OK)
 
+            # Shared caches can only store public tiles for a short time
+            res = other_client.get("/api/projects/{}/tasks/{}/orthophoto/tiles/{}.png".format(project.id, task.id, tile_path['orthophoto']))
+            self.assertEqual(res['Cache-Control'], 'public, max-age={}, s-maxage={}'.format(settings.TILE_HTTP_MAX_AGE, settings.SHARED_HTTP_MAX_AGE))
+
             # He cannot change a task
             res = other_client.patch("/api/projects/{}/tasks/{}/".format(project.id, task.id), {
                 'name': "Changed! Uh oh"
@@ -0,0 +1,40 @@
+import os
+import shutil
+import tempfile
+
+from app.cogeo import valid_cogeo, get_validation_record_path, get_gdal_version
+from .classes import BootTestCase
+
+
+class TestCogeo(BootTestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_validation_cache(self):
+        raster = os.path.join(self.tmpdir, "orthophoto.tif")
+        shutil.copy(os.path.join("app", "fixtures", "orthophoto.tif"), raster)
+
+        # Only valid results are recorded
+        valid = valid_cogeo(raster, use_cache=True)
+        record = get_validation_record_path(raster)
+        self.assertEqual(os.path.isfile(record), valid)
+
+        # Recorded results are trusted
+        os.makedirs(os.path.dirname(record), exist_ok=True)
+        open(record, 'w').close()
+        self.assertTrue(valid_cogeo(raster, use_cache=True))
+        self.assertEqual(valid_cogeo(raster), valid)
+
+        # Changed files are validated again
+        os.utime(raster, (0, 0))
+        self.assertNotEqual(get_validation_record_path(raster), record)
+        self.assertEqual(valid_cogeo(raster, use_cache=True), valid)
+
+    def test_gdal_version(self):
+        get_gdal_version.cache_clear()
+        version = get_gdal_version()
+        self.assertEqual(get_gdal_version(), version)
+        self.assertEqual(get_gdal_version.cache_info().misses, 1)
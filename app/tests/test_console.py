@@ -0,0 +1,72 @@
+import os
+import json
+import shutil
+import tempfile
+
+from app.classes.console import Console, INDEX_INTERVAL
+from .classes import BootTestCase
+
+
+class TestConsole(BootTestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_console(self):
+        console = Console(os.path.join(self.tmpdir, "data", "console_output.txt"))
+        self.assertEqual(console.output(), "")
+        self.assertEqual(console.line_count(), 0)
+
+        # Lines of different lengths (and with multi-byte characters)
+        lines = ["line{} {}".format(i, "é" * (i % 7)) for i in range(2500)]
+        console.reset("\n".join(lines[:1200]))
+        console.append("\n" + "\n".join(lines[1200:]))
+        self.assertEqual(console.line_count(), 2500)
+
+        # The byte offset of every INDEX_INTERVAL-th line is stored in the index
+        data = "\n".join(lines).encode('utf-8')
+        with open(console.index_file) as f:
+            index_data = f.read()
+        index = json.loads(index_data)
+        self.assertEqual(index['size'], len(data))
+        self.assertEqual(index['newlines'], 2499)
+        self.assertEqual(index['offsets'], [len("\n".join(lines[:line]).encode('utf-8')) + (1 if line > 0 else 0)
+                                            for line in range(0, 2500, INDEX_INTERVAL)])
+
+        def check_output():
+            # Reads from lines on, right before and right after checkpoints
+            for line in [0, 1, 999, 1000, 1001, 1500, 1999, 2000, 2001, len(lines) - 1]:
+                self.assertEqual(console.output(line), "\n".join(lines[line:]))
+            self.assertEqual(console.output(len(lines)), "")
+            self.assertEqual(console.output(len(lines) + 1000), "")
+            self.assertEqual(console.output(-1), "\n".join(lines))
+
+        check_output()
+
+        # A missing index is rebuilt
+        os.remove(console.index_file)
+        self.assertEqual(console.line_count(), 2500)
+        check_output()
+
+        # As well as a truncated one
+        with open(console.index_file, 'w') as f:
+            f.write(index_data[:10])
+        check_output()
+
+        # Or one that is out of date
+        with open(console.file, 'a') as f:
+            f.write("\nline2500")
+        lines.append("line2500")
+        self.assertEqual(console.line_count(), 2501)
+        check_output()
+
+        console.append("\nline2501")
+        lines.append("line2501")
+        check_output()
+
+        # Output can be replaced
+        console.reset("line1\nline2")
+        self.assertEqual(console.line_count(), 2)
+        self.assertEqual(console.output(1), "line2")
@@ -0,0 +1,45 @@
+import os
+import shutil
+import tempfile
+
+from app.dataset_pool import DatasetPool
+from .classes import BootTestCase
+
+
+class TestDatasetPool(BootTestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_dataset_pool(self):
+        rasters = []
+        for i in range(3):
+            raster = os.path.join(self.tmpdir, "orthophoto{}.tif".format(i))
+            shutil.copy(os.path.join("app", "fixtures", "orthophoto.tif"), raster)
+            rasters.append(raster)
+
+        pool = DatasetPool(max_open=2)
+
+        # Handles are reused
+        src = pool.get(rasters[0])
+        self.assertEqual(src.width, 212)
+        self.assertIs(pool.get(rasters[0]), src)
+
+        # Least recently used handles are closed
+        pool.get(rasters[1])
+        pool.get(rasters[2])
+        self.assertEqual(len(pool.datasets), 2)
+        self.assertTrue(src.closed)
+        self.assertFalse(rasters[0] in pool.datasets)
+
+        # Handles are invalidated when the file changes
+        src = pool.get(rasters[2])
+        os.remove(rasters[2])
+        shutil.copy(os.path.join("app", "fixtures", "orthophoto.tif"), rasters[2])
+        self.assertIsNot(pool.get(rasters[2]), src)
+        self.assertTrue(src.closed)
+
+        pool.clear()
+        self.assertEqual(len(pool.datasets), 0)
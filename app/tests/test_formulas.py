@@ -1,6 +1,8 @@
 import re
+import numpy as np
 from django.test import TestCase
-from app.api.formulas import lookup_formula, get_algorithm_list, get_camera_filters_for, algos
+from app.api.formulas import lookup_formula, get_algorithm_list, get_camera_filters_for, algos, \
+    lookup_compiled_formula, compile_expression
 
 class TestFormulas(TestCase):
     def setUp(self):
@@ -25,6 +27,26 @@ class TestFormulas(TestCase):
         self.assertTrue(lookup_formula("_TESTFUNC", "RGB")[0] == "b1+(sqrt(b3))")
         self.assertTrue(lookup_formula("_TESTFUNC", "RGB")[1] == None)
 
+    def test_compiled_formulas(self):
+        self.assertIsNone(lookup_compiled_formula(None))
+
+        f = lookup_compiled_formula("_TESTFUNC", "BGR")
+        self.assertEqual(f.expr, "b3+(sqrt(b1))")
+        self.assertEqual(f.indexes, (1, 3))
+
+        # Compiled once
+        self.assertIs(f, lookup_compiled_formula("_TESTFUNC", "BGR"))
+
+        data = np.array([[4, 9], [1, 1], [2, 5]], dtype=np.uint16)
+        res = f.evaluate(data[[0, 2]])
+        self.assertEqual(res.dtype, np.float32)
+        self.assertTrue(np.allclose(res, [[4.0, 8.0]]))
+
+        # Multiple expressions, NaNs are set to zero
+        f = compile_expression("b2/b1,b1*2")
+        res = f.evaluate(np.array([[0, 2], [0, 3]], dtype=np.float32))
+        self.assertTrue(np.allclose(res, [[0.0, 1.5], [0.0, 4.0]]))
+
     def test_algo_list(self):
         al = get_algorithm_list()
 
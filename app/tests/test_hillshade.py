@@ -0,0 +1,46 @@
+import numpy as np
+from django.test import TestCase
+
+from app.api.hillshade import LightSource
+from app.api.hsvblend import hsv_blend
+from app.scripts.benchmark_hillshade import reference_hillshade, reference_hsv_blend
+
+
+class TestHillshade(TestCase):
+    def setUp(self):
+        self.rng = np.random.RandomState(42)
+
+    def test_hillshade(self):
+        ls = LightSource(azdeg=315, altdeg=45)
+
+        for size in (256, 512):
+            x, y = np.meshgrid(np.linspace(0, 10, size), np.linspace(0, 10, size))
+            elevation = (np.sin(x) * np.cos(y) * 20 + 150 + self.rng.rand(size, size)).astype(np.float32)
+
+            for vert_exag in (1, 3):
+                expected = reference_hillshade(ls, elevation.astype(np.float64), vert_exag=vert_exag, dx=0.5, dy=0.5)
+                intensity = ls.hillshade(elevation, vert_exag=vert_exag, dx=0.5, dy=0.5)
+
+                self.assertEqual(intensity.dtype, np.float32)
+                self.assertEqual(intensity.shape, (size, size))
+                self.assertTrue(np.allclose(intensity, expected, atol=1e-4))
+
+        # Huge exaggerations do not produce invalid values
+        intensity = ls.hillshade(elevation, vert_exag=1e35, dx=0.5, dy=0.5)
+        self.assertFalse(np.isnan(intensity).any())
+
+    def test_hsv_blend(self):
+        for size in (256, 512):
+            rgb = self.rng.randint(0, 256, (3, size, size)).astype(np.uint8)
+
+            # Include some grays
+            rgb[:, 0:10, :] = rgb[0, 0:10, :]
+
+            intensity = self.rng.rand(size, size).astype(np.float32) * 255.0
+
+            expected = reference_hsv_blend(rgb, intensity)
+            blended = hsv_blend(rgb, intensity)
+
+            self.assertEqual(blended.dtype, np.uint8)
+            self.assertEqual(blended.shape, (3, size, size))
+            self.assertTrue(np.abs(blended.astype(np.int16) - expected.astype(np.int16)).max() <= 1)
@@ -0,0 +1,58 @@
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import rasterio
+from rasterio.enums import ColorInterp
+
+from app.api.formulas import compile_expression
+from app.raster_utils import export_raster_index, compute_index_block
+from .classes import BootTestCase
+
+
+class TestRasterUtils(BootTestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_export_raster_index(self):
+        input = os.path.join("app", "fixtures", "orthophoto.tif")
+        output = os.path.join(self.tmpdir, "index.tif")
+        expression = "(b2 - b1) / (b2 + b1)"
+
+        progress = []
+        export_raster_index(input, expression, output, progress_callback=progress.append, threads=4)
+        self.assertEqual(progress[-1], 1.0)
+
+        with rasterio.open(input) as src:
+            data = src.read(indexes=(1, 2), out_dtype=np.float32)
+            expected = compute_index_block(data, compile_expression(expression), False)
+            alpha = src.read(src.colorinterp.index(ColorInterp.alpha) + 1)
+
+            with rasterio.open(output) as dst:
+                self.assertEqual(dst.count, 1)
+                self.assertEqual(dst.width, src.width)
+                self.assertEqual(dst.height, src.height)
+                self.assertEqual(dst.dtypes[0], 'float32')
+                self.assertEqual(dst.nodata, -9999)
+                self.assertTrue(dst.profile['tiled'])
+
+                result = dst.read(1)
+
+        # Alpha pixels are set to nodata
+        self.assertTrue(np.any(alpha == 0))
+        self.assertTrue(np.all(result[alpha == 0] == -9999))
+
+        valid = result != -9999
+        self.assertTrue(np.all(alpha[valid] != 0))
+        self.assertTrue(np.any(valid))
+        self.assertTrue(np.allclose(result[valid], expected[0][valid]))
+
+        # Same output regardless of the number of threads
+        single_output = os.path.join(self.tmpdir, "index_single.tif")
+        export_raster_index(input, expression, single_output, threads=1)
+        with rasterio.open(single_output) as dst:
+            self.assertTrue(np.array_equal(dst.read(1), result))
@@ -0,0 +1,63 @@
+import time
+
+from django.contrib.auth.models import User, AnonymousUser
+from guardian.shortcuts import assign_perm, remove_perm
+
+from app import task_access_cache
+from app.models import Project, Task
+from app.task_access_cache import TTLCache
+from .classes import BootTestCase
+
+
+class TestTaskAccessCache(BootTestCase):
+    def setUp(self):
+        task_access_cache.tasks.clear()
+        task_access_cache.project_access.clear()
+
+    def test_ttl_cache(self):
+        cache = TTLCache(0.1, max_entries=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.set("c", 3)
+
+        # Oldest entries are removed
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.get("b"), 2)
+
+        cache.remove_if(lambda k: k == "b")
+        self.assertIsNone(cache.get("b"))
+
+        # Entries expire
+        time.sleep(0.2)
+        self.assertIsNone(cache.get("c"))
+
+    def test_task_access_cache(self):
+        user = User.objects.get(username="testuser")
+        other_user = User.objects.get(username="testuser2")
+        project = Project.objects.get(name="User Test Project")
+        task = Task.objects.create(project=project)
+
+        # Tasks are cached
+        cached_task = task_access_cache.get_task(task.id)
+        self.assertEqual(cached_task.id, task.id)
+        self.assertIs(task_access_cache.get_task(task.id), cached_task)
+
+        # Until they change
+        task.public = True
+        task.save()
+        self.assertIsNot(task_access_cache.get_task(task.id), cached_task)
+        self.assertTrue(task_access_cache.get_task(task.id).public)
+
+        self.assertTrue(task_access_cache.has_project_access(user, project))
+        self.assertFalse(task_access_cache.has_project_access(other_user, project))
+        self.assertFalse(task_access_cache.has_project_access(AnonymousUser(), project))
+
+        # Permission changes are picked up
+        assign_perm('view_project', other_user, project)
+        self.assertTrue(task_access_cache.has_project_access(User.objects.get(pk=other_user.pk), project))
+        remove_perm('view_project', other_user, project)
+        self.assertFalse(task_access_cache.has_project_access(User.objects.get(pk=other_user.pk), project))
+
+        # Deleted tasks are not found
+        task.delete()
+        self.assertRaises(Task.DoesNotExist, task_access_cache.get_task, task.id)
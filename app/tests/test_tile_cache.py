@@ -0,0 +1,78 @@
+import os
+
+from app.models import Project, Task
+from app import tile_cache
+from app.tile_cache import LRUCache
+from .classes import BootTestCase
+from .utils import clear_test_media_root
+
+
+class TestTileCache(BootTestCase):
+    def setUp(self):
+        super().setUp()
+
+    def tearDown(self):
+        clear_test_media_root()
+
+    def test_lru_cache(self):
+        cache = LRUCache(10)
+        cache.set("a", b"1234")
+        cache.set("b", b"1234")
+        self.assertEqual(cache.get("a"), b"1234")
+
+        # "b" is the least recently used and is evicted
+        cache.set("c", b"1234")
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), b"1234")
+        self.assertEqual(cache.get("c"), b"1234")
+        self.assertEqual(cache.size, 8)
+
+        # Values larger than the cache are not stored
+        cache.set("d", b"01234567890")
+        self.assertIsNone(cache.get("d"))
+
+        cache.remove_prefix("a")
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.size, 4)
+
+    def test_tile_cache(self):
+        project = Project.objects.get(name="User Test Project")
+        task = Task.objects.create(project=project)
+        task.create_task_directories()
+
+        raster = task.assets_path("dsm.tif")
+        with open(raster, 'w') as f:
+            f.write("test")
+
+        params = {'formula': None, 'rescale': '0,1000', 'color_map': 'gray'}
+        key = tile_cache.get_cache_key(raster, 'dsm', 16, 1, 2, 1, 'png', params)
+
+        # Key is stable and depends on the tile parameters
+        self.assertEqual(key, tile_cache.get_cache_key(raster, 'dsm', 16, 1, 2, 1, 'png', dict(params)))
+        self.assertNotEqual(key, tile_cache.get_cache_key(raster, 'dsm', 16, 1, 3, 1, 'png', params))
+        self.assertNotEqual(key, tile_cache.get_cache_key(raster, 'dsm', 16, 1, 2, 1, 'png', {'rescale': '0,100'}))
+
+        self.assertIsNone(tile_cache.get_tile(task, 'dsm', key, 'png'))
+        tile_cache.set_tile(task, 'dsm', key, 'png', b"tile")
+        self.assertEqual(tile_cache.get_tile(task, 'dsm', key, 'png'), b"tile")
+
+        # Served from disk when not in memory
+        tile_cache.memory_cache.clear()
+        self.assertEqual(tile_cache.get_tile(task, 'dsm', key, 'png'), b"tile")
+
+        # Eviction
+        self.assertEqual(tile_cache.cleanup_tile_cache(max_size=1000), 0)
+        self.assertEqual(tile_cache.cleanup_tile_cache(max_size=0), 1)
+        tile_cache.memory_cache.clear()
+        self.assertIsNone(tile_cache.get_tile(task, 'dsm', key, 'png'))
+
+        # Changing the raster invalidates the key
+        with open(raster, 'w') as f:
+            f.write("changed")
+        self.assertNotEqual(key, tile_cache.get_cache_key(raster, 'dsm', 16, 1, 2, 1, 'png', params))
+
+        # Clear
+        tile_cache.set_tile(task, 'dsm', key, 'png', b"tile")
+        tile_cache.clear_tile_cache(task)
+        self.assertFalse(os.path.exists(tile_cache.tile_cache_path(task)))
+        self.assertIsNone(tile_cache.get_tile(task, 'dsm', key, 'png'))
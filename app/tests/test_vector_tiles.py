@@ -0,0 +1,157 @@
+import os
+import json
+import shutil
+import struct
+import tempfile
+
+import mercantile
+import numpy as np
+
+from app.vector_tiles import build_point_index, load_point_index, encode_point_layer, PointIndex, EXTENT, BUFFER
+from .classes import BootTestCase
+
+
+def read_varint(data, pos):
+    result = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7f) << shift
+        shift += 7
+        if not byte & 0x80:
+            return result, pos
+
+
+def read_message(data):
+    """
+    Minimal protocol buffers decoder
+    :return: list of (field number, value) tuples
+    """
+    fields = []
+    pos = 0
+    while pos < len(data):
+        key, pos = read_varint(data, pos)
+        number, wire_type = key >> 3, key & 0x7
+        if wire_type == 0:
+            value, pos = read_varint(data, pos)
+        elif wire_type == 1:
+            value = struct.unpack('<d', data[pos:pos + 8])[0]
+            pos += 8
+        elif wire_type == 2:
+            length, pos = read_varint(data, pos)
+            value = data[pos:pos + length]
+            pos += length
+        else:
+            raise ValueError("Unsupported wire type {}".format(wire_type))
+        fields.append((number, value))
+    return fields
+
+
+def read_packed(data):
+    values = []
+    pos = 0
+    while pos < len(data):
+        value, pos = read_varint(data, pos)
+        values.append(value)
+    return values
+
+
+def unzigzag(value):
+    return (value >> 1) ^ -(value & 1)
+
+
+class TestVectorTiles(BootTestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_vector_tiles(self):
+        geojson_path = os.path.join(self.tmpdir, "shots.geojson")
+        index_path = os.path.join(self.tmpdir, "index", "shots.json")
+
+        with open(geojson_path, 'w') as f:
+            json.dump({
+                'type': 'FeatureCollection',
+                'features': [
+                    {'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': [-91.99, 46.84, 200.0]},
+                     'properties': {'filename': 'DJI_0001.JPG', 'focal': 0.85, 'rotation': [0.1, 0.2, 0.3]}},
+                    {'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': [10.0, 10.0]},
+                     'properties': {'filename': 'DJI_0002.JPG', 'focal': 0.85}},
+                    {'type': 'Feature', 'geometry': {'type': 'LineString', 'coordinates': [[0, 0], [1, 1]]},
+                     'properties': {}},
+                ]
+            }, f)
+
+        self.assertEqual(build_point_index(geojson_path, index_path), 2)
+
+        index = load_point_index(index_path)
+        self.assertIs(load_point_index(index_path), index)
+
+        tile = mercantile.tile(-91.99, 46.84, 16)
+        points = index.query(tile.z, tile.x, tile.y)
+        self.assertEqual(len(points), 1)
+        x, y, properties, fid = points[0]
+        self.assertTrue(0 <= x <= EXTENT and 0 <= y <= EXTENT)
+        self.assertEqual(properties['filename'], 'DJI_0001.JPG')
+        self.assertEqual(fid, 0)
+
+        # Both points are in the world tile
+        self.assertEqual(len(index.query(0, 0, 0)), 2)
+
+        # Decode the tile
+        layers = read_message(encode_point_layer("shots", points))
+        self.assertEqual(len(layers), 1)
+        self.assertEqual(layers[0][0], 3)
+
+        layer = read_message(layers[0][1])
+        self.assertIn((15, 2), layer)
+        self.assertIn((1, b"shots"), layer)
+        self.assertIn((5, EXTENT), layer)
+
+        keys = [v.decode('utf-8') for n, v in layer if n == 3]
+        values = [read_message(v)[0] for n, v in layer if n == 4]
+        features = [read_message(v) for n, v in layer if n == 2]
+        self.assertEqual(len(features), 1)
+
+        feature = dict(features[0])
+        self.assertEqual(feature[3], 1) # POINT
+        self.assertEqual(read_packed(feature[4]), [9, (x << 1) ^ (x >> 63), (y << 1) ^ (y >> 63)])
+        self.assertEqual([unzigzag(v) for v in read_packed(feature[4])[1:]], [x, y])
+
+        tags = read_packed(feature[2])
+        props = {keys[tags[i]]: values[tags[i + 1]] for i in range(0, len(tags), 2)}
+        self.assertEqual(props['filename'], (1, b'DJI_0001.JPG'))
+        self.assertEqual(props['focal'], (3, 0.85))
+        self.assertEqual(json.loads(props['rotation'][1].decode('utf-8')), [0.1, 0.2, 0.3])
+
+    def test_point_index_query(self):
+        # The spatial index returns the same points as a linear scan
+        rng = np.random.RandomState(1)
+        lnglats = np.concatenate([
+            np.column_stack([rng.uniform(-180, 180, 500), rng.uniform(-85, 85, 500)]),
+            np.column_stack([rng.uniform(-92, -91.98, 500), rng.uniform(46.83, 46.85, 500)])
+        ])
+        features = [list(mercantile.xy(lng, lat)) + [{'id': i}] for i, (lng, lat) in enumerate(lnglats)]
+
+        index_path = os.path.join(self.tmpdir, "shots.json")
+        with open(index_path, 'w') as f:
+            json.dump({'features': features}, f)
+        index = PointIndex(index_path)
+
+        coords = np.array([f[0:2] for f in features])
+
+        def linear_scan(z, x, y):
+            left, bottom, right, top = mercantile.xy_bounds(x, y, z)
+            tx = np.round((coords[:, 0] - left) * EXTENT / (right - left)).astype(np.int64)
+            ty = np.round((top - coords[:, 1]) * EXTENT / (top - bottom)).astype(np.int64)
+            inside = (tx >= -BUFFER) & (tx <= EXTENT + BUFFER) & (ty >= -BUFFER) & (ty <= EXTENT + BUFFER)
+            return [(int(tx[i]), int(ty[i]), features[i][2], int(i)) for i in np.nonzero(inside)[0]]
+
+        for z in [0, 3, 10, 16, 20, 22, 30]:
+            for lng, lat in lnglats[::50]:
+                tile = mercantile.tile(lng, lat, z)
+                for x, y in [(tile.x, tile.y), (tile.x + 1, tile.y), (tile.x, tile.y + 1)]:
+                    if x < 2 ** z and y < 2 ** z:
+                        self.assertEqual(index.query(z, x, y), linear_scan(z, x, y))
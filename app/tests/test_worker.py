@@ -1,4 +1,5 @@
 import os
+import time
 from stat import ST_ATIME, ST_MTIME
 
 import json
@@ -10,7 +11,9 @@ from nodeodm.models import ProcessingNode
 from webodm import settings
 from .classes import BootTestCase
 from .utils import start_processing_node
-from worker.tasks import redis_client
+from worker.tasks import redis_client, get_poll_delay, schedule_task, TASK_SCHEDULE_KEY
+from app import pending_actions
+from nodeodm import status_codes
 from rest_framework.test import APIClient
 from rest_framework import status
 
@@ -84,6 +87,91 @@ class TestWorker(BootTestCase):
         worker.tasks.cleanup_tmp_directory()
         self.assertFalse(os.path.exists(tmpdir))
 
+    def test_task_schedule(self):
+        project = Project.objects.get(name="User Test Project")
+        pnode = ProcessingNode.objects.create(hostname="localhost", port=11223)
+        task = Task(project=project, processing_node=pnode, status=status_codes.RUNNING, running_progress=0)
+
+        min_interval, max_interval, backoff = settings.TASK_POLL_MIN_INTERVAL, settings.TASK_POLL_MAX_INTERVAL, settings.TASK_POLL_BACKOFF
+        settings.TASK_POLL_MIN_INTERVAL, settings.TASK_POLL_MAX_INTERVAL, settings.TASK_POLL_BACKOFF = 5, 60, 2
+        try:
+            # Tasks are polled often while their progress changes
+            self.assertEqual(get_poll_delay(task, 20, True), 5)
+
+            # While it does not, the previous delay is multiplied by TASK_POLL_BACKOFF (up to the maximum)
+            self.assertEqual(get_poll_delay(task, 5, False), 10)
+            self.assertEqual(get_poll_delay(task, 40, False), 60)
+
+            # Unless they are about to complete
+            task.running_progress = Task.TASK_PROGRESS_LAST_VALUE * 0.95
+            self.assertEqual(get_poll_delay(task, 40, False), 5)
+
+            # Or have a pending action
+            task.running_progress = 0
+            task.pending_action = pending_actions.CANCEL
+            self.assertEqual(get_poll_delay(task, 40, False), 5)
+        finally:
+            settings.TASK_POLL_MIN_INTERVAL, settings.TASK_POLL_MAX_INTERVAL, settings.TASK_POLL_BACKOFF = min_interval, max_interval, backoff
+
+        redis_client.delete(TASK_SCHEDULE_KEY)
+
+        # A task waiting for a processing node (none is online)
+        ProcessingNode.objects.update(last_refreshed=None)
+        task = Task.objects.create(project=project)
+
+        # Pending tasks that are not scheduled are processed right away
+        # and stale entries are removed
+        schedule_task("bogus")
+        worker.tasks.process_pending_tasks()
+        self.assertIsNotNone(redis_client.zscore(TASK_SCHEDULE_KEY, str(task.id)))
+        self.assertIsNone(redis_client.zscore(TASK_SCHEDULE_KEY, "bogus"))
+
+        # Tasks that are not due are not processed
+        schedule_task(task.id, 3600)
+        worker.tasks.process_pending_tasks()
+        self.assertGreater(redis_client.zscore(TASK_SCHEDULE_KEY, str(task.id)), time.time() + 3000)
+
+        # Tasks that are no longer pending are removed
+        task.delete()
+        worker.tasks.process_pending_tasks()
+        self.assertIsNone(redis_client.zscore(TASK_SCHEDULE_KEY, str(task.id)))
+
+    def test_task_webhook(self):
+        client = APIClient()
+        project = Project.objects.get(name="User Test Project")
+        ProcessingNode.objects.update(last_refreshed=None)
+        task = Task.objects.create(project=project)
+
+        # Disabled by default
+        self.assertIsNone(task.get_webhook_url())
+
+        base_url = settings.TASK_WEBHOOK_BASE_URL
+        settings.TASK_WEBHOOK_BASE_URL = "http://webodm:8000/"
+        try:
+            self.assertEqual(task.get_webhook_url(), "http://webodm:8000/api/projects/{}/tasks/{}/webhook/?token={}".format(
+                             project.id, task.id, task.get_webhook_token()))
+        finally:
+            settings.TASK_WEBHOOK_BASE_URL = base_url
+
+        url = "/api/projects/{}/tasks/{}/webhook/".format(project.id, task.id)
+        redis_client.zrem(TASK_SCHEDULE_KEY, str(task.id))
+
+        # Invalid tokens are rejected
+        res = client.post(url + "?token=invalid")
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+        res = client.post(url)
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertIsNone(redis_client.zscore(TASK_SCHEDULE_KEY, str(task.id)))
+
+        # A valid token causes the task to be processed (and scheduled)
+        res = client.post(url + "?token=" + task.get_webhook_token())
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIsNotNone(redis_client.zscore(TASK_SCHEDULE_KEY, str(task.id)))
+
+        # Tasks of other projects cannot be notified
+        res = client.post("/api/projects/{}/tasks/{}/webhook/?token={}".format(project.id + 1, task.id, task.get_webhook_token()))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
     def test_workers_api(self):
         client = APIClient()
 
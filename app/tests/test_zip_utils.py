@@ -0,0 +1,193 @@
+import os
+import re
+import requests
+import shutil
+import tempfile
+import threading
+import zipfile
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+from app import zip_utils
+from app.zip_utils import extract_zip, download_and_extract_zip, RangeRequestsNotSupported, IncompleteRangeResponse
+from .classes import BootTestCase
+
+
+def serve_file(path, corrupt_ranges=None, support_ranges=True, requested_ranges=None, truncate_ranges=False):
+    """
+    Serve a file over HTTP with range requests support
+    :param corrupt_ranges: list of byte ranges (start, end) whose first response is corrupted
+    :param truncate_ranges: whether to send one byte less than requested for (non suffix) byte ranges
+    :param requested_ranges: optional list where the byte ranges (start, end) that are served are recorded
+    :return: (server, url)
+    """
+    corrupt_ranges = list(corrupt_ranges or [])
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            with open(path, 'rb') as f:
+                data = f.read()
+            size = len(data)
+
+            m = re.match(r'bytes=(\d*)-(\d*)', self.headers.get('Range', ''))
+            if not support_ranges or m is None:
+                self.send_response(200)
+                self.send_header('Content-Length', str(size))
+                self.end_headers()
+                self.wfile.write(data)
+                return
+
+            if m.group(1) == '':
+                start, end = max(0, size - int(m.group(2))), size
+            else:
+                start, end = int(m.group(1)), min(size, int(m.group(2)) + 1)
+                if truncate_ranges:
+                    end -= 1
+
+            if requested_ranges is not None:
+                requested_ranges.append((start, end))
+
+            content = bytearray(data[start:end])
+            for cstart, cend in list(corrupt_ranges):
+                if start <= cstart < end:
+                    for i in range(cstart, min(cend, end)):
+                        content[i - start] ^= 0xff
+                    corrupt_ranges.remove((cstart, cend))
+
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes {}-{}/{}'.format(start, end - 1, size))
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(bytes(content))
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, 'http://127.0.0.1:{}/all.zip'.format(server.server_address[1])
+
+
+class TestZipUtils(BootTestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_extract_zip(self):
+        zip_path = os.path.join(self.tmpdir, "all.zip")
+        files = {
+            "odm_orthophoto/odm_orthophoto.tif": os.urandom(1024 * 1024 * 3),
+            "odm_dem/dsm.tif": b"dsm" * 1000,
+            "images.json": b"[]",
+            "../outside.txt": b"unsafe",
+        }
+        with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zip_h:
+            zip_h.writestr("empty/", b"")
+            for name, data in files.items():
+                zip_h.writestr(name, data)
+
+        dest = os.path.join(self.tmpdir, "assets")
+        progress = []
+        extracted = []
+        extract_zip(zip_path, dest, threads=4,
+                    progress_callback=lambda done, total: progress.append((done, total)),
+                    member_callback=extracted.append)
+
+        total = sum(len(data) for data in files.values())
+        self.assertEqual(progress[-1], (total, total))
+        self.assertTrue(all(done <= total for done, _ in progress))
+
+        self.assertTrue(os.path.isdir(os.path.join(dest, "empty")))
+        for name, data in files.items():
+            path = os.path.join(dest, name.replace("../", ""))
+            self.assertIn(path, extracted)
+            with open(path, "rb") as f:
+                self.assertEqual(f.read(), data)
+
+        # Members cannot escape the destination directory
+        self.assertFalse(os.path.exists(os.path.join(self.tmpdir, "outside.txt")))
+
+        # Extraction can be interrupted from the progress callback
+        def interrupt(done, total):
+            raise InterruptedError()
+
+        with self.assertRaises(InterruptedError):
+            extract_zip(zip_path, os.path.join(self.tmpdir, "interrupted"), threads=2, progress_callback=interrupt)
+
+        # Corrupted archives are detected
+        with open(zip_path, "r+b") as f:
+            f.truncate(100)
+        with self.assertRaises(zipfile.BadZipFile):
+            extract_zip(zip_path, dest)
+
+    def test_download_and_extract_zip(self):
+        zip_path = os.path.join(self.tmpdir, "source.zip")
+        files = {
+            "odm_orthophoto/odm_orthophoto.tif": os.urandom(1024 * 1024 * 3),
+            "odm_dem/dsm.tif": b"dsm" * 100000,
+            "images.json": b"[]",
+        }
+        with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zip_h:
+            for name, data in files.items():
+                zip_h.writestr(name, data)
+
+        # Corrupt the data of members the first time they are downloaded
+        with zipfile.ZipFile(zip_path, "r") as zip_h:
+            corrupt_offsets = [zip_h.getinfo("odm_dem/dsm.tif").header_offset + 100,
+                               zip_h.getinfo("odm_orthophoto/odm_orthophoto.tif").header_offset + 1024 * 1024]
+
+        requested_ranges = []
+        server, url = serve_file(zip_path, corrupt_ranges=[(offset, offset + 10) for offset in corrupt_offsets],
+                                 requested_ranges=requested_ranges)
+        chunk_size, tail_size = zip_utils.DOWNLOAD_CHUNK_SIZE, zip_utils.TAIL_SIZE
+        zip_utils.DOWNLOAD_CHUNK_SIZE = 256 * 1024
+        zip_utils.TAIL_SIZE = 64
+        try:
+            dest = os.path.join(self.tmpdir, "assets")
+            downloaded_zip = os.path.join(self.tmpdir, "all.zip")
+            progress = []
+            extracted = []
+            download_and_extract_zip(url, downloaded_zip, dest, threads=4,
+                                     progress_callback=lambda done, total: progress.append((done, total)),
+                                     member_callback=extracted.append)
+        finally:
+            zip_utils.DOWNLOAD_CHUNK_SIZE, zip_utils.TAIL_SIZE = chunk_size, tail_size
+            server.shutdown()
+
+        self.assertEqual(progress[-1][0], progress[-1][1])
+        for name, data in files.items():
+            path = os.path.join(dest, name)
+            self.assertIn(path, extracted)
+            with open(path, "rb") as f:
+                self.assertEqual(f.read(), data)
+
+        # Corrupted members are downloaded again, without requesting more
+        # than a chunk at a time (the orthophoto member spans multiple chunks)
+        for offset in corrupt_offsets:
+            self.assertEqual(len([r for r in requested_ranges if r[0] <= offset < r[1]]), 2)
+        self.assertTrue(all(end - start <= 256 * 1024 for start, end in requested_ranges[1:]))
+
+        # The archive is stored as well (with the corrupted ranges downloaded again)
+        with open(zip_path, "rb") as a, open(downloaded_zip, "rb") as b:
+            self.assertEqual(a.read(), b.read())
+
+        # Servers without range requests support are detected
+        server, url = serve_file(zip_path, support_ranges=False)
+        try:
+            with self.assertRaises(RangeRequestsNotSupported):
+                download_and_extract_zip(url, downloaded_zip, dest)
+        finally:
+            server.shutdown()
+
+        # Truncated responses are retried, then reported as network errors
+        server, url = serve_file(zip_path, truncate_ranges=True)
+        max_range_attempts = zip_utils.MAX_RANGE_ATTEMPTS
+        zip_utils.MAX_RANGE_ATTEMPTS = 2
+        try:
+            with self.assertRaises(IncompleteRangeResponse) as cm:
+                download_and_extract_zip(url, downloaded_zip, os.path.join(self.tmpdir, "truncated"))
+            self.assertTrue(isinstance(cm.exception, requests.exceptions.RequestException))
+        finally:
+            zip_utils.MAX_RANGE_ATTEMPTS = max_range_attempts
+            server.shutdown()
@@ -0,0 +1,203 @@
+import os
+import hashlib
+import logging
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+
+from webodm import settings
+
+logger = logging.getLogger('app.logger')
+
+
+class LRUCache:
+    """
+    Thread-safe, size-bounded least recently used cache
+    of bytes values. Size is measured in bytes.
+    """
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.size = 0
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            value = self.items.get(key)
+            if value is not None:
+                self.items.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if len(value) > self.max_size:
+            return
+
+        with self.lock:
+            if key in self.items:
+                self.size -= len(self.items.pop(key))
+
+            self.items[key] = value
+            self.size += len(value)
+
+            while self.size > self.max_size:
+                _, evicted = self.items.popitem(last=False)
+                self.size -= len(evicted)
+
+    def remove_prefix(self, prefix):
+        with self.lock:
+            for key in [k for k in self.items if k.startswith(prefix)]:
+                self.size -= len(self.items.pop(key))
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+            self.size = 0
+
+
+memory_cache = LRUCache(settings.TILE_CACHE_MEMORY_SIZE)
+
+
+def is_enabled():
+    return settings.TILE_CACHE_ENABLED
+
+
+def tile_cache_path(task, *args):
+    """
+    Get a path relative to the place where rendered tiles are cached
+    for a task. This is outside of the assets directory, so that
+    cached tiles are not exposed as task assets.
+    """
+    return task.task_path("cache", "tiles", *args)
+
+
+def get_cache_key(raster_path, tile_type, z, x, y, scale, ext, params):
+    """
+    Compute a key that identifies a rendered tile. The key includes the
+    identity of the source raster (inode, modification time and size), so
+    that tiles rendered from a previous version of a raster
+    (e.g. before a task is restarted or re-imported) are never served.
+    :param raster_path: path to the raster the tile is rendered from
+    :param params: dictionary of (normalized) rendering parameters
+    :return: hex digest
+    """
+    st = os.stat(raster_path)
+    parts = [st.st_ino, st.st_mtime_ns, st.st_size, tile_type, z, x, y, scale, ext]
+    parts += ["{}={}".format(k, params[k]) for k in sorted(params) if params[k] is not None]
+
+    return hashlib.sha1("|".join(map(str, parts)).encode('utf-8')).hexdigest()
+
+
+def _tile_file(task, tile_type, key, ext):
+    return tile_cache_path(task, tile_type, key[:2], "{}.{}".format(key, ext))
+
+
+def get_tile(task, tile_type, key, ext):
+    """
+    Lookup a rendered tile from the memory cache first,
+    then from the disk cache
+    :return: bytes of the encoded image or None if the tile is not cached
+    """
+    memory_key = "{}/{}".format(task.id, key)
+    data = memory_cache.get(memory_key)
+    if data is not None:
+        return data
+
+    tile_file = _tile_file(task, tile_type, key, ext)
+    try:
+        with open(tile_file, 'rb') as f:
+            data = f.read()
+
+        # Keep track of last access for eviction
+        os.utime(tile_file)
+    except FileNotFoundError:
+        return None
+
+    memory_cache.set(memory_key, data)
+    return data
+
+
+def set_tile(task, tile_type, key, ext, data):
+    """
+    Store a rendered tile in both the memory and the disk cache
+    """
+    memory_cache.set("{}/{}".format(task.id, key), data)
+
+    tile_file = _tile_file(task, tile_type, key, ext)
+    tile_dir = os.path.dirname(tile_file)
+
+    try:
+        os.makedirs(tile_dir, exist_ok=True)
+
+        # Write to a temporary file first, so that
+        # concurrent readers never see partial tiles
+        fd, tmp_file = tempfile.mkstemp(suffix='.tmp', dir=tile_dir)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_file, tile_file)
+    except OSError as e:
+        logger.warning("Cannot write tile cache file {}: {}".format(tile_file, str(e)))
+
+
+def clear_tile_cache(task):
+    """
+    Remove all cached tiles for a task
+    """
+    memory_cache.remove_prefix("{}/".format(task.id))
+
+    cache_dir = tile_cache_path(task)
+    if os.path.exists(cache_dir):
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        logger.info("Cleared tile cache for {}".format(task))
+
+
+def cleanup_tile_cache(max_size=None):
+    """
+    Evict least recently used tiles from the disk cache
+    until its total size is below max_size bytes
+    :return: number of evicted tiles
+    """
+    if max_size is None:
+        max_size = settings.TILE_CACHE_MAX_SIZE
+
+    projects_dir = os.path.join(settings.MEDIA_ROOT, "project")
+    if not os.path.isdir(projects_dir):
+        return 0
+
+    tiles = []
+    total_size = 0
+
+    for project_id in os.listdir(projects_dir):
+        tasks_dir = os.path.join(projects_dir, project_id, "task")
+        if not os.path.isdir(tasks_dir):
+            continue
+
+        for task_id in os.listdir(tasks_dir):
+            cache_dir = os.path.join(tasks_dir, task_id, "cache", "tiles")
+            for root, _, files in os.walk(cache_dir):
+                for f in files:
+                    tile_file = os.path.join(root, f)
+                    try:
+                        st = os.stat(tile_file)
+                    except FileNotFoundError:
+                        continue
+                    tiles.append((st.st_mtime, st.st_size, tile_file))
+                    total_size += st.st_size
+
+    if total_size <= max_size:
+        return 0
+
+    evicted = 0
+    tiles.sort()
+    for _, size, tile_file in tiles:
+        try:
+            os.remove(tile_file)
+            evicted += 1
+        except FileNotFoundError:
+            pass
+
+        total_size -= size
+        if total_size <= max_size:
+            break
+
+    return evicted
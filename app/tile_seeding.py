@@ -0,0 +1,100 @@
+import os
+import logging
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+
+import mercantile
+from rest_framework import exceptions
+
+from app import tile_cache
+from app.api.tiler import get_extent, get_raster_path, get_tile_params, get_default_rescale, render_tile, get_zoom_safe, \
+    ZOOM_EXTRA_LEVELS
+from app.dataset_pool import open_dataset
+from app.raster_stats import get_raster_stats
+from webodm import settings
+
+logger = logging.getLogger('app.logger')
+
+SEED_BATCH_SIZE = 1000
+
+
+def get_default_tile_params(task, tile_type):
+    """
+    :return: the query parameters used by the map viewer
+        when it first displays a layer of the given type
+        (Task.MAP_TILE_PARAMS and the rescale value returned by the metadata endpoint)
+    """
+    stats = get_raster_stats(task, tile_type, get_raster_path(task, tile_type))
+    return {**task.MAP_TILE_PARAMS.get(tile_type, {}), 'rescale': get_default_rescale(stats['info']['statistics'])}
+
+
+def seed_tiles(task, tile_types=None, max_zoom=None, threads=None):
+    """
+    Render the tiles of a task's rasters into the tile cache,
+    from the lowest zoom level up to max_zoom, with the parameters that the map viewer
+    uses by default. Only scale 1 tiles are rendered: on HiDPI screens the viewer
+    (Leaflet's detectRetina) requests scale 1 tiles from the next zoom level instead,
+    so @2x tiles requested by other clients are not pre-rendered.
+    :param task: Task
+    :param tile_types: list of tile types (defaults to all available)
+    :param max_zoom: highest zoom level to seed (defaults to TILE_SEEDING_MAX_ZOOM)
+    :param threads: number of threads (defaults to TILE_SEEDING_THREADS)
+    :return: number of tiles rendered
+    """
+    if not tile_cache.is_enabled():
+        logger.warning("Tile cache is disabled, cannot seed tiles for {}".format(task))
+        return 0
+
+    if tile_types is None:
+        tile_types = [t for t in ['orthophoto', 'dsm', 'dtm'] if "{}.tif".format(t) in task.available_assets]
+    if max_zoom is None:
+        max_zoom = settings.TILE_SEEDING_MAX_ZOOM
+    if threads is None:
+        threads = settings.TILE_SEEDING_THREADS
+
+    count = 0
+
+    for tile_type in tile_types:
+        raster_path = get_raster_path(task, tile_type)
+        if not os.path.isfile(raster_path):
+            continue
+
+        try:
+            params = get_tile_params(tile_type, get_default_tile_params(task, tile_type))
+            west, south, east, north = get_extent(task, tile_type).extent
+
+            with open_dataset(raster_path) as src:
+                minzoom, maxzoom = get_zoom_safe(src)
+        except Exception as e:
+            logger.warning("Cannot seed {} tiles for {}: {}".format(tile_type, task, str(e)))
+            continue
+
+        zooms = range(max(0, minzoom - ZOOM_EXTRA_LEVELS), min(maxzoom, max_zoom) + 1)
+
+        ext = settings.TILE_FORMATS.get(tile_type, 'png')
+
+        def seed(tile):
+            key = tile_cache.get_cache_key(raster_path, tile_type, tile.z, tile.x, tile.y, 1, ext, params)
+            if tile_cache.get_tile(task, tile_type, key, ext) is not None:
+                return False
+
+            try:
+                img = render_tile(raster_path, tile_type, tile.z, tile.x, tile.y, 1, ext, params)
+            except exceptions.NotFound:
+                return False
+
+            tile_cache.set_tile(task, tile_type, key, ext, img)
+            return True
+
+        logger.info("Seeding {} tiles for {} (zoom levels {}-{})".format(tile_type, task, zooms.start, zooms.stop - 1))
+        tiles = mercantile.tiles(west, south, east, north, zooms)
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            # Submit tiles in batches to keep memory usage bounded
+            while True:
+                batch = list(itertools.islice(tiles, SEED_BATCH_SIZE))
+                if not batch:
+                    break
+                count += sum(executor.map(seed, batch))
+
+    logger.info("Seeded {} tiles for {}".format(count, task))
+    return count
@@ -0,0 +1,272 @@
+import os
+import json
+import struct
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+
+import mercantile
+import numpy as np
+
+logger = logging.getLogger('app.logger')
+
+# Tile coordinates range (Mapbox Vector Tile default)
+EXTENT = 4096
+
+# Features this far outside of a tile (in tile units) are still included,
+# so that point symbols are not cut at tile borders
+BUFFER = 64
+
+MVT_CONTENT_TYPE = 'application/vnd.mapbox-vector-tile'
+
+
+def vector_index_path(task, *args):
+    """
+    Get a path relative to the place where vector tile indexes are stored for a task
+    """
+    return task.task_path("cache", "vector", *args)
+
+
+def build_point_index(geojson_path, index_path):
+    """
+    Build a vector tile index from the point features of a GeoJSON file (in EPSG:4326).
+    Coordinates are projected to web mercator once, so that tiles can be
+    generated by filtering the index.
+    """
+    with open(geojson_path, 'r') as f:
+        geojson = json.load(f)
+
+    features = []
+    for feature in geojson.get('features', []):
+        geometry = feature.get('geometry') or {}
+        if geometry.get('type') != 'Point':
+            continue
+
+        lng, lat = geometry['coordinates'][0:2]
+        mx, my = mercantile.xy(lng, lat)
+        features.append([mx, my, feature.get('properties') or {}])
+
+    index_dir = os.path.dirname(index_path)
+    os.makedirs(index_dir, exist_ok=True)
+    fd, tmp_file = tempfile.mkstemp(suffix='.tmp', dir=index_dir)
+    with os.fdopen(fd, 'w') as f:
+        json.dump({'features': features}, f)
+    os.replace(tmp_file, index_path)
+
+    return len(features)
+
+
+# Points are sorted by the Morton code (Z-order) of the tile that contains them at this zoom level,
+# so that the points of any tile at this level or below are a contiguous range of the index
+INDEX_ZOOM = 20
+
+# Highest zoom level that can be requested
+MAX_ZOOM = 30
+
+# Half the width of the web mercator world, in meters
+WORLD_HALF = 20037508.342789244
+
+
+def spread_bits(v):
+    """
+    Insert a zero bit between each of the (lower 32) bits of v (an int or an array of np.uint64)
+    """
+    masks = [0x0000FFFF0000FFFF, 0x00FF00FF00FF00FF, 0x0F0F0F0F0F0F0F0F, 0x3333333333333333, 0x5555555555555555]
+    for shift, mask in zip([16, 8, 4, 2, 1], masks):
+        if isinstance(v, np.ndarray):
+            v = (v | (v << np.uint64(shift))) & np.uint64(mask)
+        else:
+            v = (v | (v << shift)) & mask
+    return v
+
+
+def morton_code(x, y):
+    """
+    :return: Morton code of tile coordinates (an int or an array of np.uint64)
+    """
+    if isinstance(x, np.ndarray):
+        return spread_bits(x) | (spread_bits(y) << np.uint64(1))
+    return spread_bits(x) | (spread_bits(y) << 1)
+
+
+class PointIndex:
+    def __init__(self, index_path):
+        with open(index_path, 'r') as f:
+            features = json.load(f)['features']
+
+        coords = np.array([f[0:2] for f in features], dtype=np.float64).reshape((-1, 2))
+        self.properties = [f[2] for f in features]
+
+        # Tile coordinates at INDEX_ZOOM
+        n = 2 ** INDEX_ZOOM
+        tx = np.clip(np.floor((coords[:, 0] + WORLD_HALF) / (2 * WORLD_HALF) * n), 0, n - 1).astype(np.uint64)
+        ty = np.clip(np.floor((WORLD_HALF - coords[:, 1]) / (2 * WORLD_HALF) * n), 0, n - 1).astype(np.uint64)
+        codes = morton_code(tx, ty)
+
+        # Sort points by code (the original position is kept as feature id)
+        self.ids = np.argsort(codes, kind='stable')
+        self.codes = codes[self.ids]
+        self.coords = coords[self.ids]
+
+    def query(self, z, x, y):
+        """
+        :return: list of (tile x, tile y, properties, feature id) of the points in a tile (and its buffer)
+        """
+        # Candidates are the points in the tile containing the requested tile at INDEX_ZOOM
+        # (or in the requested tile, for lower zoom levels) and in its neighbors, which cover the buffer
+        cz = min(z, INDEX_ZOOM)
+        cx, cy = x >> (z - cz), y >> (z - cz)
+        shift = 2 * (INDEX_ZOOM - cz)
+
+        ranges = []
+        for nx in range(max(0, cx - 1), min(2 ** cz, cx + 2)):
+            for ny in range(max(0, cy - 1), min(2 ** cz, cy + 2)):
+                code = morton_code(nx, ny)
+                ranges.append(np.arange(*np.searchsorted(self.codes, [code << shift, (code + 1) << shift])))
+
+        candidates = np.concatenate(ranges)
+        coords = self.coords[candidates]
+
+        left, bottom, right, top = mercantile.xy_bounds(x, y, z)
+        tx = np.round((coords[:, 0] - left) * EXTENT / (right - left)).astype(np.int64)
+        ty = np.round((top - coords[:, 1]) * EXTENT / (top - bottom)).astype(np.int64)
+
+        inside = (tx >= -BUFFER) & (tx <= EXTENT + BUFFER) & (ty >= -BUFFER) & (ty <= EXTENT + BUFFER)
+
+        points = [(int(tx[i]), int(ty[i]), int(self.ids[candidates[i]])) for i in np.nonzero(inside)[0]]
+        points.sort(key=lambda p: p[2])
+
+        return [(px, py, self.properties[fid], fid) for px, py, fid in points]
+
+
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+MAX_LOADED_INDEXES = 16
+
+def load_point_index(index_path):
+    """
+    Load a point index, reusing previously loaded indexes unless the file has changed
+    """
+    st = os.stat(index_path)
+    key = (index_path, st.st_mtime_ns, st.st_size)
+
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is not None:
+            _indexes.move_to_end(key)
+            return index
+
+    index = PointIndex(index_path)
+
+    with _indexes_lock:
+        _indexes[key] = index
+        while len(_indexes) > MAX_LOADED_INDEXES:
+            _indexes.popitem(last=False)
+
+    return index
+
+
+def get_shots_index(task):
+    """
+    Get the camera shots index of a task, building it if needed
+    :return: PointIndex or None if the task has no camera shots
+    """
+    geojson_path = task.assets_path(task.ASSETS_MAP['shots.geojson'])
+    if not os.path.isfile(geojson_path):
+        return None
+
+    index_path = vector_index_path(task, "shots.json")
+    if not os.path.isfile(index_path) or os.path.getmtime(index_path) < os.path.getmtime(geojson_path):
+        build_point_index(geojson_path, index_path)
+
+    return load_point_index(index_path)
+
+
+# Protocol buffers encoding of Mapbox Vector Tiles
+# https://github.com/mapbox/vector-tile-spec/tree/master/2.1
+
+def _varint(value):
+    out = bytearray()
+    while True:
+        byte = value & 0x7f
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _zigzag(value):
+    return (value << 1) ^ (value >> 63)
+
+
+def _field(number, wire_type):
+    return _varint((number << 3) | wire_type)
+
+
+def _bytes_field(number, data):
+    return _field(number, 2) + _varint(len(data)) + data
+
+
+def _varint_field(number, value):
+    return _field(number, 0) + _varint(value)
+
+
+def _packed_field(number, values):
+    return _bytes_field(number, b''.join(_varint(v) for v in values))
+
+
+def _encode_value(value):
+    if isinstance(value, bool):
+        return _varint_field(7, int(value))
+    elif isinstance(value, int) and -2**63 <= value < 2**63:
+        return _varint_field(6, _zigzag(value))
+    elif isinstance(value, float):
+        return _field(3, 1) + struct.pack('<d', value)
+    elif isinstance(value, str):
+        return _bytes_field(1, value.encode('utf-8'))
+    else:
+        # Arrays, objects, etc.
+        return _bytes_field(1, json.dumps(value).encode('utf-8'))
+
+
+def encode_point_layer(name, points):
+    """
+    Encode a layer of point features
+    :param name: layer name
+    :param points: list of (tile x, tile y, properties, feature id)
+    :return: bytes
+    """
+    keys = OrderedDict()
+    values = OrderedDict()
+    features = []
+
+    for x, y, properties, fid in points:
+        tags = []
+        for k, v in properties.items():
+            if v is None:
+                continue
+            if k not in keys:
+                keys[k] = len(keys)
+            vkey = (type(v).__name__, json.dumps(v, sort_keys=True))
+            if vkey not in values:
+                values[vkey] = (len(values), v)
+            tags += [keys[k], values[vkey][0]]
+
+        feature = _varint_field(1, fid)
+        if tags:
+            feature += _packed_field(2, tags)
+        feature += _varint_field(3, 1) # POINT
+        feature += _packed_field(4, [(1 & 0x7) | (1 << 3), _zigzag(x), _zigzag(y)]) # MoveTo(x, y)
+        features.append(_bytes_field(2, feature))
+
+    layer = _varint_field(15, 2)
+    layer += _bytes_field(1, name.encode('utf-8'))
+    layer += b''.join(features)
+    layer += b''.join(_bytes_field(3, k.encode('utf-8')) for k in keys)
+    layer += b''.join(_bytes_field(4, _encode_value(v)) for _, v in values.values())
+    layer += _varint_field(5, EXTENT)
+
+    return _bytes_field(3, layer)
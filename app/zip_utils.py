@@ -0,0 +1,396 @@
+# Concurrent extraction of zip archives
+import os
+import time
+import zlib
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import requests
+
+from webodm import settings
+
+# Size of the chunks copied from a member to disk
+CHUNK_SIZE = 1024 * 1024
+
+# How often (in seconds) the progress callback is invoked
+PROGRESS_INTERVAL = 1
+
+# Size of the byte ranges requested when downloading archives
+DOWNLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+
+# Number of attempts to download a byte range (or to extract a member
+# after downloading its bytes again) before giving up
+MAX_RANGE_ATTEMPTS = 5
+
+# Initial size of the end of an archive that is downloaded
+# to read its central directory (enlarged until the whole directory is read)
+TAIL_SIZE = 1024 * 1024
+
+
+class ExtractionInterrupted(Exception):
+    pass
+
+
+class RangeRequestsNotSupported(Exception):
+    pass
+
+
+class IncompleteRangeResponse(requests.exceptions.RequestException):
+    pass
+
+
+def get_member_path(dest_dir, info):
+    """
+    Get the path where a member should be extracted, the same way ZipFile.extract does
+    (absolute paths and ".." components are discarded so that members cannot escape dest_dir)
+    """
+    arcname = info.filename.replace('/', os.path.sep)
+    if os.path.altsep:
+        arcname = arcname.replace(os.path.altsep, os.path.sep)
+    arcname = os.path.splitdrive(arcname)[1]
+    parts = [p for p in arcname.split(os.path.sep) if p not in ('', os.path.curdir, os.path.pardir)]
+    return os.path.join(dest_dir, *parts)
+
+
+class ZipHandles:
+    """
+    Per-thread handles of a zip archive (ZipFile handles cannot be shared safely across threads)
+    :param buffered: set to False if the archive is being written while it is read,
+        so that previously buffered data is never returned
+    """
+    def __init__(self, zip_path, buffered=True):
+        self.zip_path = zip_path
+        self.buffered = buffered
+        self.local = threading.local()
+        self.handles = []
+        self.lock = threading.Lock()
+
+    def get(self):
+        if not hasattr(self.local, 'zip_h'):
+            f = open(self.zip_path, "rb", buffering=-1 if self.buffered else 0)
+            self.local.zip_h = zipfile.ZipFile(f, "r")
+            with self.lock:
+                self.handles.append((self.local.zip_h, f))
+        return self.local.zip_h
+
+    def close(self):
+        with self.lock:
+            for zip_h, f in self.handles:
+                zip_h.close()
+                f.close()
+            self.handles = []
+
+
+def extract_member(zip_h, info, dest_dir, stop=None, bytes_callback=None):
+    """
+    Extract a single member of a zip archive, verifying its CRC
+    :param stop: threading.Event that interrupts the extraction when set
+    :param bytes_callback: called with the number of bytes written after each chunk
+    :return: path of the extracted file or None if the member is a directory
+    """
+    target = get_member_path(dest_dir, info)
+    if info.is_dir():
+        os.makedirs(target, exist_ok=True)
+        return None
+
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    with zip_h.open(info) as src, open(target, "wb") as dst:
+        while True:
+            if stop is not None and stop.is_set():
+                raise ExtractionInterrupted()
+
+            chunk = src.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            dst.write(chunk)
+
+            if bytes_callback is not None:
+                bytes_callback(len(chunk))
+
+    return target
+
+
+def get_threads(threads):
+    if threads is None:
+        threads = settings.ZIP_EXTRACT_THREADS
+    if threads <= 0:
+        threads = os.cpu_count() or 1
+    return threads
+
+
+def run_pipeline(futures, process_done, progress_callback, stop):
+    """
+    Wait for a set of futures (which can grow), passing each completed future
+    to process_done, and report progress periodically. On failure, remaining
+    futures are canceled and running ones are asked to stop.
+    """
+    pending = futures
+    try:
+        while pending:
+            done, pending = wait(pending, timeout=PROGRESS_INTERVAL, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                pending |= process_done(future)
+
+            if progress_callback is not None:
+                progress_callback()
+    except:
+        stop.set()
+        for future in pending:
+            future.cancel()
+        raise
+
+
+def extract_zip(zip_path, dest_dir, threads=None, progress_callback=None, member_callback=None):
+    """
+    Extract all members of a zip archive concurrently.
+    Each thread reads from its own handle of the archive; decompression
+    happens in zlib, which releases the GIL.
+    :param zip_path: path to the archive
+    :param dest_dir: directory to extract to
+    :param threads: number of threads (defaults to ZIP_EXTRACT_THREADS)
+    :param progress_callback: called periodically (and at the end) from the calling thread
+        with (bytes extracted, total bytes). It can raise an exception to interrupt the extraction.
+    :param member_callback: called from the calling thread with the path of each extracted file,
+        as soon as it has been written
+    :raises zipfile.BadZipFile: if the archive is corrupted
+    """
+    threads = get_threads(threads)
+
+    with zipfile.ZipFile(zip_path, "r") as zip_h:
+        members = zip_h.infolist()
+
+    total_bytes = sum(info.file_size for info in members)
+    extracted_bytes = 0
+    progress_lock = threading.Lock()
+    stop = threading.Event()
+    handles = ZipHandles(zip_path)
+
+    def add_bytes(count):
+        nonlocal extracted_bytes
+        with progress_lock:
+            extracted_bytes += count
+
+    def extract(info):
+        if stop.is_set():
+            return None
+        return extract_member(handles.get(), info, dest_dir, stop, add_bytes)
+
+    def process_done(future):
+        target = future.result()
+        if target is not None and member_callback is not None:
+            member_callback(target)
+        return set()
+
+    def report_progress():
+        if progress_callback is not None:
+            progress_callback(extracted_bytes, total_bytes)
+
+    # Directories first, then the largest members, so that threads stay busy until the end
+    members.sort(key=lambda info: (not info.is_dir(), -info.file_size))
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, min(threads, len(members)))) as executor:
+            run_pipeline({executor.submit(extract, info) for info in members}, process_done, report_progress, stop)
+    finally:
+        handles.close()
+
+    if progress_callback is not None:
+        progress_callback(total_bytes, total_bytes)
+
+
+class RangeDownloader:
+    """
+    Download byte ranges of a remote file with HTTP range requests
+    (one session per thread)
+    """
+    def __init__(self, url, timeout=30):
+        self.url = url
+        self.timeout = timeout
+        self.local = threading.local()
+
+    def session(self):
+        if not hasattr(self.local, 'session'):
+            self.local.session = requests.Session()
+        return self.local.session
+
+    def request(self, range_header):
+        """
+        :return: (content, total size of the remote file)
+        """
+        with self.session().get(self.url, headers={'Range': range_header}, timeout=self.timeout, stream=True) as r:
+            r.raise_for_status()
+
+            content_range = r.headers.get('Content-Range', '')
+            if r.status_code != 206 or not content_range.startswith('bytes ') or '/' not in content_range:
+                raise RangeRequestsNotSupported()
+
+            size = content_range.split('/')[-1]
+            if not size.isdigit():
+                raise RangeRequestsNotSupported()
+
+            return r.content, int(size)
+
+    def get_tail(self, length):
+        return self.request('bytes=-{}'.format(length))
+
+    def get_range(self, start, end):
+        """
+        :return: bytes in [start, end), retrying on network errors and short reads
+        """
+        for attempt in range(MAX_RANGE_ATTEMPTS):
+            try:
+                content, _ = self.request('bytes={}-{}'.format(start, end - 1))
+                if len(content) != end - start:
+                    raise IncompleteRangeResponse("Expected {} bytes, received {}".format(end - start, len(content)))
+                return content
+            except requests.exceptions.RequestException:
+                if attempt == MAX_RANGE_ATTEMPTS - 1:
+                    raise
+                time.sleep(2 ** attempt)
+
+
+def download_and_extract_zip(url, zip_path, dest_dir, threads=None, progress_callback=None, member_callback=None, timeout=30):
+    """
+    Download a zip archive with concurrent HTTP range requests, writing it to zip_path,
+    and extract each member as soon as all of its bytes have been downloaded.
+    The central directory is downloaded first, so that the position of members is known.
+    Members that fail their CRC check are downloaded and extracted again
+    (up to MAX_RANGE_ATTEMPTS times) rather than the whole archive.
+    :param url: URL of the archive (the server must support range requests)
+    :param zip_path: path where to store the archive
+    :param dest_dir: directory to extract to
+    :param threads: number of concurrent downloads (extraction uses ZIP_EXTRACT_THREADS)
+    :param progress_callback: called periodically (and at the end) from the calling thread
+        with (bytes downloaded and extracted, total bytes). It can raise an exception to interrupt.
+    :param member_callback: called from the calling thread with the path of each extracted file
+    :param timeout: timeout of each request in seconds
+    :raises RangeRequestsNotSupported: if the server does not support range requests
+    :raises zipfile.BadZipFile: if the archive (or one of its members) is corrupted
+    :raises requests.exceptions.RequestException: on network errors (or incomplete responses)
+    """
+    if threads is None:
+        threads = 16
+    downloader = RangeDownloader(url, timeout)
+
+    # Read the central directory
+    tail_size = TAIL_SIZE
+    while True:
+        tail, size = downloader.get_tail(tail_size)
+        tail_start = size - len(tail)
+
+        with open(zip_path, "wb") as f:
+            f.truncate(size)
+            f.seek(tail_start)
+            f.write(tail)
+
+        try:
+            with zipfile.ZipFile(zip_path, "r") as zip_h:
+                members = zip_h.infolist()
+            break
+        except zipfile.BadZipFile:
+            if tail_start == 0:
+                raise
+            tail_size *= 4
+
+    del tail
+
+    # Member spans: from their local header to the next member's local header
+    members.sort(key=lambda info: info.header_offset)
+    spans = {}
+    for i, info in enumerate(members):
+        end = members[i + 1].header_offset if i + 1 < len(members) else size
+        spans[info.filename] = (info.header_offset, max(info.header_offset, end))
+
+    # Download chunks covering everything before the tail
+    chunks = [(start, min(start + DOWNLOAD_CHUNK_SIZE, tail_start)) for start in range(0, tail_start, DOWNLOAD_CHUNK_SIZE)]
+    chunk_members = [[] for _ in chunks]
+    remaining_chunks = {}
+    for info in members:
+        start, end = spans[info.filename]
+        end = min(end, tail_start)
+        count = 0
+        if start < end:
+            for c in range(start // DOWNLOAD_CHUNK_SIZE, (end - 1) // DOWNLOAD_CHUNK_SIZE + 1):
+                chunk_members[c].append(info)
+                count += 1
+        remaining_chunks[info.filename] = count
+
+    total_bytes = tail_start + sum(info.file_size for info in members)
+    done_bytes = 0
+    progress_lock = threading.Lock()
+    stop = threading.Event()
+    handles = ZipHandles(zip_path, buffered=False)
+    fd = os.open(zip_path, os.O_RDWR)
+
+    def add_bytes(count):
+        nonlocal done_bytes
+        with progress_lock:
+            done_bytes += count
+
+    def download(chunk):
+        if stop.is_set():
+            raise ExtractionInterrupted()
+        start, end = chunk
+        os.pwrite(fd, downloader.get_range(start, end), start)
+        add_bytes(end - start)
+        return chunk
+
+    def extract(info):
+        for attempt in range(MAX_RANGE_ATTEMPTS):
+            if stop.is_set():
+                raise ExtractionInterrupted()
+
+            written = 0
+            def count_bytes(count):
+                nonlocal written
+                written += count
+                add_bytes(count)
+
+            try:
+                return extract_member(handles.get(), info, dest_dir, stop, count_bytes)
+            except (zipfile.BadZipFile, zlib.error, EOFError):
+                add_bytes(-written)
+                if attempt == MAX_RANGE_ATTEMPTS - 1:
+                    raise zipfile.BadZipFile("{} is corrupted".format(info.filename))
+
+                # Download the member again (in chunks, to keep memory usage bounded)
+                start, end = spans[info.filename]
+                for chunk_start in range(start, end, DOWNLOAD_CHUNK_SIZE):
+                    if stop.is_set():
+                        raise ExtractionInterrupted()
+                    chunk_end = min(chunk_start + DOWNLOAD_CHUNK_SIZE, end)
+                    os.pwrite(fd, downloader.get_range(chunk_start, chunk_end), chunk_start)
+
+    def report_progress():
+        if progress_callback is not None:
+            progress_callback(done_bytes, total_bytes)
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, threads)) as download_executor, \
+             ThreadPoolExecutor(max_workers=max(1, get_threads(None))) as extract_executor:
+            download_futures = {download_executor.submit(download, chunk): i for i, chunk in enumerate(chunks)}
+
+            def process_done(future):
+                new_futures = set()
+                if future in download_futures:
+                    future.result()
+                    for info in chunk_members[download_futures[future]]:
+                        remaining_chunks[info.filename] -= 1
+                        if remaining_chunks[info.filename] == 0:
+                            new_futures.add(extract_executor.submit(extract, info))
+                else:
+                    target = future.result()
+                    if target is not None and member_callback is not None:
+                        member_callback(target)
+                return new_futures
+
+            ready = {extract_executor.submit(extract, info) for info in members if remaining_chunks[info.filename] == 0}
+            run_pipeline(set(download_futures) | ready, process_done, report_progress, stop)
+    finally:
+        handles.close()
+        os.close(fd)
+
+    if progress_callback is not None:
+        progress_callback(total_bytes, total_bytes)
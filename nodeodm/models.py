@@ -98,7 +98,7 @@ class ProcessingNode(models.Model):
 
         return opts
 
-    def process_new_task(self, images, name=None, options=[], progress_callback=None):
+    def process_new_task(self, images, name=None, options=[], progress_callback=None, webhook=None):
         """
         Sends a set of images (and optional GCP file) via the API
         to start processing.
@@ -107,6 +107,7 @@ class ProcessingNode(models.Model):
         :param name: name of the task
         :param options: options to be used for processing ([{'name': optionName, 'value': optionValue}, ...])
         :param progress_callback: optional callback invoked during the upload images process to be used to report status.
+        :param webhook: optional URL that the node calls when the task has finished processing
 
         :returns UUID of the newly created task
         """
@@ -116,7 +117,10 @@ class ProcessingNode(models.Model):
 
         opts = self.options_list_to_dict(options)
 
-        task = api_client.create_task(images, opts, name, progress_callback)
+        if webhook is not None:
+            task = api_client.create_task(images, opts, name, progress_callback, webhook=webhook)
+        else:
+            task = api_client.create_task(images, opts, name, progress_callback)
         return task.uuid
 
     def get_task_info(self, uuid, with_output=None):
@@ -168,6 +172,12 @@ class ProcessingNode(models.Model):
         task = api_client.get_task(uuid)
         return task.download_zip(destination, progress_callback, parallel_downloads=parallel_downloads)
 
+    def get_task_assets_url(self, uuid):
+        """
+        :returns URL of the archive containing all of the assets of a task
+        """
+        return self.api_client().url('/task/{}/download/all.zip'.format(uuid), {})
+
     def restart_task(self, uuid, options = None):
         """
         Restarts a task that was previously canceled or that had failed to process
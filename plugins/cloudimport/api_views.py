@@ -41,7 +41,7 @@ class ImportFolderTaskView(TaskView):
         files = platform.import_from_folder(folder_url)
         
         # Update the task with the new information
-        task.console_output += "Importing {} images...\n".format(len(files))
+        task.console.append("Importing {} images...\n".format(len(files)))
         task.images_count = len(files)
         task.pending_action = pending_actions.IMPORT
         task.save()
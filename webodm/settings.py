@@ -280,9 +280,95 @@ if TESTING:
     MEDIA_ROOT = os.path.join(BASE_DIR, 'app', 'media_test')
 MEDIA_TMP = os.path.join(MEDIA_ROOT, 'tmp')
 
+# Records of rasters that were found to be valid Cloud Optimized GeoTIFFs
+COGEO_VALIDATION_CACHE_DIR = os.path.join(MEDIA_ROOT, 'cache', 'cogeo')
+
 # Annotations directory
 ANNOTATIONS_ROOT = os.path.join(BASE_DIR, 'app', 'annotations')
 
+# Rendered map tiles cache
+TILE_CACHE_ENABLED = True
+TILE_CACHE_MAX_SIZE = 1024 * 1024 * 1024 * 5 # Bytes on disk (all tasks)
+TILE_CACHE_MEMORY_SIZE = 1024 * 1024 * 64 # Bytes in memory (per worker process)
+
+# Default image format of map tiles (png, jpg or webp) for each tile type.
+# JPG tiles that contain nodata (transparent) pixels are sent as PNG.
+TILE_FORMATS = {
+    'orthophoto': 'png',
+    'dsm': 'png',
+    'dtm': 'png',
+}
+
+# GDAL creation options for each tile image driver (png, jpeg, webp)
+TILE_ENCODING_OPTIONS = {
+    'jpeg': {'quality': 90},
+    'webp': {'quality': 90},
+}
+
+# Number of seconds browsers and proxies can reuse map tiles (and tiles metadata)
+# and task assets before revalidating them with the server
+TILE_HTTP_MAX_AGE = 60 * 60 * 24
+ASSET_HTTP_MAX_AGE = 60 * 60
+
+# Number of seconds shared caches (proxies, CDNs) can reuse the tiles and assets
+# of public tasks. Cached copies are still served for this long after a task is made private
+# (and browsers that already fetched them keep them for up to TILE_HTTP_MAX_AGE/ASSET_HTTP_MAX_AGE),
+# so keep this short.
+SHARED_HTTP_MAX_AGE = 60
+
+# Pre-render map tiles into the tile cache when a task completes,
+# from the lowest zoom level up to TILE_SEEDING_MAX_ZOOM (or the raster's
+# native maximum zoom, whichever is lower), using TILE_SEEDING_THREADS threads.
+# Only the tiles the map viewer shows by default are rendered, at scale 1
+# (HiDPI screens request scale 1 tiles from the next zoom level, @2x tiles are not pre-rendered)
+TILE_SEEDING_ENABLED = False
+TILE_SEEDING_MAX_ZOOM = 18
+TILE_SEEDING_THREADS = 2
+
+# Number of seconds the tiler can reuse task and permission lookups. Set to 0 to disable.
+# The cache is kept in the memory of each web server process and is only invalidated
+# in the process that makes a change: other processes (and other servers) can keep
+# granting access to a task that was made private, or whose permissions were revoked,
+# for up to this many seconds. Keep this short.
+TASK_ACCESS_CACHE_TTL = 10
+
+# Let the web server send files (downloads, task assets, worker results)
+# instead of streaming them through the application. Permissions are still checked
+# by the application. Set to 'x-accel-redirect' (nginx) or 'x-sendfile' (Apache, lighttpd).
+# With nginx, FILE_SERVING_ACCEL_LOCATION must be an internal location that maps to MEDIA_ROOT
+# (see nginx/nginx.conf.template). Files outside of MEDIA_ROOT are always served by the application.
+FILE_SERVING_MODE = None
+FILE_SERVING_ACCEL_LOCATION = '/_protected_media/'
+
+# Number of threads used to export raster indexes (0 = number of CPUs)
+RASTER_INDEX_EXPORT_THREADS = 0
+
+# Processing nodes are polled for the status of running tasks every TASK_POLL_MIN_INTERVAL
+# seconds while their progress changes. While it doesn't, the interval is multiplied
+# by TASK_POLL_BACKOFF at each poll, up to TASK_POLL_MAX_INTERVAL seconds.
+TASK_POLL_MIN_INTERVAL = 5
+TASK_POLL_MAX_INTERVAL = 120
+TASK_POLL_BACKOFF = 2
+if TESTING:
+    TASK_POLL_MIN_INTERVAL = TASK_POLL_MAX_INTERVAL = 0
+
+# Base URL (e.g. http://webodm.example.com:8000) that processing nodes can reach
+# to notify WebODM when a task has finished processing, so that results are retrieved
+# without waiting for the next poll. Leave to None to disable.
+TASK_WEBHOOK_BASE_URL = None
+
+# Number of threads used to extract the assets of completed tasks (0 = number of CPUs)
+ZIP_EXTRACT_THREADS = 0
+
+# Extract the assets of completed tasks while they are being downloaded
+# from processing nodes (nodes that don't support HTTP range requests
+# fall back to downloading the whole archive first)
+TASK_ASSETS_PIPELINED_DOWNLOAD = True
+
+# Maximum number of raster datasets kept open by the tiler
+# (per worker thread). Set to 0 to disable pooling.
+DATASET_POOL_MAX_OPEN = 32
+
 FILE_UPLOAD_TEMP_DIR = MEDIA_TMP
 
 # Store flash messages in cookies
@@ -31,6 +31,14 @@ app.conf.beat_schedule = {
             'retry': False
         }
     },
+    'cleanup-tile-cache': {
+        'task': 'worker.tasks.cleanup_tile_cache',
+        'schedule': 600,
+        'options': {
+            'expires': 299,
+            'retry': False
+        }
+    },
     'process-pending-tasks': {
         'task': 'worker.tasks.process_pending_tasks',
         'schedule': 5,
@@ -19,11 +19,27 @@ from webodm import settings
 import worker
 from .celery import app
 from app.raster_utils import export_raster_index as export_raster_index_sync
+from app.tile_cache import cleanup_tile_cache as cleanup_tile_cache_sync
+from app.plugins.signals import task_completed
+from app import tile_cache
+from django.dispatch import receiver
 import redis
 
 logger = get_task_logger("app.logger")
 redis_client = redis.Redis.from_url(settings.CELERY_BROKER_URL)
 
+# Redis sorted set of pending task IDs, scored by the time they should be processed next
+TASK_SCHEDULE_KEY = 'task_schedule'
+
+# Number of seconds after which a task that was enqueued for processing is due again
+TASK_SCHEDULE_LEASE = 60
+
+# Redis hash of pending task IDs --> last delay between their polls (in seconds)
+TASK_POLL_DELAYS_KEY = 'task_poll_delays'
+
+# Tasks are polled often once their progress reaches this fraction of the processing
+NEAR_COMPLETION_PROGRESS = 0.9
+
 # What class to use for async results, since during testing we need to mock it
 TestSafeAsyncResult = worker.celery.MockAsyncResult if settings.TESTING else app.AsyncResult
 
@@ -65,6 +81,15 @@ def cleanup_tmp_directory():
             logger.info('Cleaned up: %s (%s)' % (f, modified))
 
 
+@app.task
+def cleanup_tile_cache():
+    # Evict least recently used tiles when the
+    # tile cache grows beyond its maximum size
+    evicted = cleanup_tile_cache_sync()
+    if evicted > 0:
+        logger.info("Evicted {} tiles from the tile cache".format(evicted))
+
+
 # Based on https://stackoverflow.com/questions/22498038/improve-current-implementation-of-a-setinterval-python/22498708#22498708
 def setInterval(interval, func, *args):
     stopped = Event()
@@ -87,8 +112,11 @@ def process_task(taskId):
         if task_lock_last_update is not None:
             # Check if lock has expired
             if time.time() - float(task_lock_last_update) <= 30:
-                # Locked
+                # Locked. The task is being processed, but changes made
+                # in the meanwhile (e.g. user actions) might have been missed,
+                # so make sure that it's processed again right after
                 delete_lock = False
+                redis_client.set('task_reschedule_{}'.format(taskId), 1, ex=TASK_SCHEDULE_LEASE)
                 return
             else:
                 # Expired
@@ -105,6 +133,8 @@ def process_task(taskId):
             logger.info("Task {} has already been deleted.".format(taskId))
             return
 
+        previous_progress = (task.status, task.running_progress)
+
         try:
             task.process()
         except Exception as e:
@@ -112,6 +142,12 @@ def process_task(taskId):
                 "Uncaught error! This is potentially bad. Please report it to http://github.com/OpenDroneMap/WebODM/issues: {} {}".format(
                     e, traceback.format_exc()))
             if settings.TESTING: raise e
+        finally:
+            last_delay = float(redis_client.hget(TASK_POLL_DELAYS_KEY, str(task.id)) or 0)
+            delay = get_poll_delay(task, last_delay, (task.status, task.running_progress) != previous_progress)
+            if redis_client.delete('task_reschedule_{}'.format(taskId)):
+                delay = 0
+            schedule_task(task.id, delay)
     finally:
         if cancel_monitor is not None:
             cancel_monitor()
@@ -136,11 +172,54 @@ def get_pending_tasks():
                                   processing_node__isnull=False, partial=False) |
                                 Q(pending_action__isnull=False, partial=False))
 
+def get_poll_delay(task, last_delay=0, progress_changed=True):
+    """
+    :param last_delay: delay that was used before the last time the task was processed
+    :param progress_changed: whether the status or progress of the task changed the last time it was processed
+    :return: number of seconds after which a task should be processed again.
+        Processing nodes are polled often while a task makes progress or is about to complete,
+        and less and less often while its progress stays the same (e.g. during long stages).
+    """
+    if task.pending_action is None and task.processing_node_id is not None and \
+            task.status in [status_codes.QUEUED, status_codes.RUNNING] and not progress_changed and \
+            task.running_progress < NEAR_COMPLETION_PROGRESS * Task.TASK_PROGRESS_LAST_VALUE:
+        return min(settings.TASK_POLL_MAX_INTERVAL,
+                   max(settings.TASK_POLL_MIN_INTERVAL, last_delay * settings.TASK_POLL_BACKOFF))
+    else:
+        return settings.TASK_POLL_MIN_INTERVAL
+
+
+def schedule_task(task_id, delay=0):
+    """
+    Set when a pending task should be processed next
+    """
+    with redis_client.pipeline() as pipe:
+        pipe.zadd(TASK_SCHEDULE_KEY, {str(task_id): time.time() + delay})
+        pipe.hset(TASK_POLL_DELAYS_KEY, str(task_id), delay)
+        pipe.execute()
+
+
 @app.task
 def process_pending_tasks():
-    tasks = get_pending_tasks()
-    for task in tasks:
-        process_task.delay(task.id)
+    task_ids = [str(task_id) for task_id in get_pending_tasks().values_list('id', flat=True)]
+    now = time.time()
+
+    # Forget tasks that are no longer pending
+    scheduled = {task_id.decode('utf-8'): due for task_id, due in redis_client.zrange(TASK_SCHEDULE_KEY, 0, -1, withscores=True)}
+    stale = set(scheduled) - set(task_ids)
+    if stale:
+        redis_client.zrem(TASK_SCHEDULE_KEY, *stale)
+        redis_client.hdel(TASK_POLL_DELAYS_KEY, *stale)
+
+    # Tasks that have not been scheduled yet are due right away
+    due = [task_id for task_id in task_ids if scheduled.get(task_id, 0) <= now]
+    if due:
+        # Don't enqueue them again until they have been processed
+        # (or until the lease expires, in case they never are)
+        redis_client.zadd(TASK_SCHEDULE_KEY, {task_id: now + TASK_SCHEDULE_LEASE for task_id in due})
+
+        for task_id in due:
+            process_task.delay(task_id)
 
 
 @app.task
@@ -153,12 +232,45 @@ def execute_grass_script(script, serialized_context = {}, out_key='output'):
         return {'error': str(e), 'context': ctx.serialize()}
 
 
+@app.task
+def seed_tiles(task_id):
+    # Imported here to avoid a circular import (the tiler imports this module)
+    from app.tile_seeding import seed_tiles as seed_tiles_sync
+
+    try:
+        task = Task.objects.get(pk=task_id)
+    except ObjectDoesNotExist:
+        logger.info("Task {} has been deleted, skipping tile seeding".format(task_id))
+        return
+
+    try:
+        seed_tiles_sync(task)
+    except Exception as e:
+        logger.error("Cannot seed tiles for {}: {}".format(task, str(e)))
+
+
+@receiver(task_completed, dispatch_uid="seed_tiles_on_task_completed")
+def handle_task_completed(sender, task_id, **kwargs):
+    if settings.TILE_SEEDING_ENABLED and tile_cache.is_enabled():
+        # Lowest priority, so that seeding does not delay other jobs
+        seed_tiles.apply_async(args=[str(task_id)], priority=9)
+
+
 @app.task(bind=True)
 def export_raster_index(self, input, expression):
     try:
         logger.info("Exporting raster index {} with expression: {}".format(input, expression))
         tmpfile = tempfile.mktemp('_raster_index.tif', dir=settings.MEDIA_TMP)
-        export_raster_index_sync(input, expression, tmpfile)
+
+        last_progress = 0
+        def progress_callback(progress):
+            nonlocal last_progress
+            # Avoid flooding the result backend
+            if progress - last_progress >= 0.01:
+                last_progress = progress
+                self.update_state(state='PROGRESS', meta={'progress': progress})
+
+        export_raster_index_sync(input, expression, tmpfile, progress_callback=progress_callback)
         result = {'file': tmpfile}
 
         if settings.TESTING: